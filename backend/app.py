@@ -1,17 +1,32 @@
 import os
-from flask import Flask, flash, redirect, render_template, request, session, url_for, send_from_directory
-from flask_session import Session
+import click
+import csv
+import io
+import tempfile
+import mimetypes
+from flask import Flask, Response, abort, flash, g, jsonify, redirect, render_template, request, session, stream_with_context, url_for, send_file
 from werkzeug.security import check_password_hash, generate_password_hash
 from werkzeug.utils import secure_filename
-from datetime import datetime
-from helpers import apology, login_required, admin_required, lookup, get_translations
+from datetime import datetime, timedelta
+from helpers import apology, login_required, admin_required, lookup, encode_cursor, decode_cursor
 from db import Database
+from i18n import get_catalogs, request_language
+from importers import BOM_FIRST_ROW, import_components
+from jobs import enqueue, get_job, job_status
+from photos import generate_variants
+from refdata import LRUCache, ReferenceCache
+from reports import DEFAULT_REPORTS_DIR, current_report
+from sessions import cleanup_expired, init_sessions
+from storage import Storage
 from dropdowns import reasons, department, action, priority, status, smth, talep
 import requests
 import re
+import time
+import uuid
 from collections import defaultdict
-from openpyxl import load_workbook
+from urllib.parse import quote, urlencode
 from dotenv import load_dotenv
+from openpyxl import Workbook
 
 # Load environment variables
 load_dotenv()
@@ -24,46 +39,212 @@ app = Flask(__name__)
 # Set application root for /df prefix
 app.config['APPLICATION_ROOT'] = '/df'
 
-# Configure session
+# Connect to PostgreSQL database (pooled; size via DB_POOL_MIN / DB_POOL_MAX)
+db = Database()
+
+# Configure session (storage chosen by SESSION_BACKEND, see sessions.py)
 app.config["SESSION_PERMANENT"] = False
-app.config["SESSION_TYPE"] = "filesystem"
 app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "dev-secret-key-change-in-production")
-Session(app)
+init_sessions(app, db)
 
-# Connect to PostgreSQL database
-db = Database()
+
+# Managers, customers, projects, groups, components and users, kept in memory
+# until a write to those tables is NOTIFY'd (see refdata.py)
+ref_cache = ReferenceCache(db)
+# typeahead results per (group, prefix); dropped whenever the reference data changes
+component_suggestions = LRUCache(ref_cache, maxsize=int(os.environ.get("SUGGEST_CACHE_SIZE", 2048)))
+
+
+@app.teardown_appcontext
+def release_db_connection(exception):
+    """Hand this request's connection back to the pool"""
+    db.release()
 
 # Create uploads directory if it doesn't exist
 # Default to a path relative to the backend directory
 UPLOADS_DIR = os.environ.get("UPLOADS_DIR", os.path.join(os.path.dirname(__file__), "static", "files", "uploads"))
 os.makedirs(UPLOADS_DIR, exist_ok=True)
+storage = Storage(UPLOADS_DIR)
+# DF report workbooks (reports.py); never under UPLOADS_DIR, which is served without a login
+REPORTS_DIR = os.environ.get("REPORTS_DIR", DEFAULT_REPORTS_DIR)
+
+# How /df/uploads responses are produced:
+#   "flask"      - stream from this process (default)
+#   "x-accel"    - let nginx serve the file via X-Accel-Redirect to UPLOADS_ACCEL_PREFIX
+#   "x-sendfile" - let Apache/lighttpd serve it via X-Sendfile
+UPLOADS_SERVE_MODE = os.environ.get("UPLOADS_SERVE_MODE", "flask").lower()
+UPLOADS_ACCEL_PREFIX = os.environ.get("UPLOADS_ACCEL_PREFIX", "/protected-uploads/")
+app.config["USE_X_SENDFILE"] = UPLOADS_SERVE_MODE == "x-sendfile"
+
+# Upload paths never get new content (photo and variant names are unique per
+# problem component), so browsers may keep them for a year without revalidating
+UPLOADS_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
 
 # Serve files from /uploads
 @app.route('/df/uploads/<path:filename>')
 def uploaded_file(filename):
     """Serve uploaded files from /uploads directory"""
-    return send_from_directory(UPLOADS_DIR, filename)
+    # reports rendered into UPLOADS_DIR before REPORTS_DIR existed are only served through problem_report
+    if filename.lower().endswith(".xlsx"):
+        abort(404)
+    path, sha256 = storage.resolve(db, filename)
+    if path is None:
+        abort(404)
+    # blobs have no extension, so the type comes from the logical name
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    if UPLOADS_SERVE_MODE == "x-accel":
+        response = Response(mimetype=mimetype)
+        response.headers["X-Accel-Redirect"] = UPLOADS_ACCEL_PREFIX + quote(os.path.relpath(path, UPLOADS_DIR))
+        if sha256:
+            response.set_etag(sha256)
+    else:
+        # conditional=True gives If-None-Match / 304 and Range requests; the
+        # content hash makes a natural strong ETag
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=sha256 or True)
+
+    response.headers["Cache-Control"] = UPLOADS_CACHE_CONTROL
+    return response
 
 # ------------------------
-# After request: prevent caching
+# Query instrumentation: per-request totals in Server-Timing (see db.QueryStats)
+# ------------------------
+@app.before_request
+def start_query_stats():
+    g.request_started = time.perf_counter()
+    db.stats.start_request(request.endpoint or "-")
+
+
+@app.after_request
+def server_timing(response):
+    totals = db.stats.finish_request()
+    if totals is not None:
+        elapsed = (time.perf_counter() - g.request_started) * 1000
+        response.headers.add(
+            "Server-Timing",
+            f'db;dur={totals["seconds"] * 1000:.1f};desc="{totals["queries"]} queries", app;dur={elapsed:.1f}',
+        )
+    return response
+
+
+# ------------------------
+# Read replicas (DB_REPLICA_URLS): a client that wrote within the last
+# READ_YOUR_WRITES_SECONDS reads from the primary, so e.g. the redirect after
+# an upload lists the new problem even if the replicas lag behind
+# ------------------------
+READ_YOUR_WRITES_SECONDS = float(os.environ.get("READ_YOUR_WRITES_SECONDS", 10))
+
+
+@app.before_request
+def route_reads():
+    if db.replicas:
+        db.begin_request(read_primary=time.time() - session.get("db_write_at", 0) < READ_YOUR_WRITES_SECONDS)
+
+
+@app.after_request
+def remember_writes(response):
+    if db.replicas and db.request_wrote():
+        session["db_write_at"] = time.time()
+    return response
+
+
+# ------------------------
+# After request: prevent caching of authenticated pages
 # ------------------------
 @app.after_request
 def after_request(response):
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Expires"] = 0
-    response.headers["Pragma"] = "no-cache"
+    # routes that set their own policy (uploads) keep it
+    if "Cache-Control" in response.headers:
+        return response
+    if response.mimetype == "text/html" and session.get("user_id"):
+        response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+        response.headers["Expires"] = 0
+        response.headers["Pragma"] = "no-cache"
     return response
 
+# ------------------------
+# Translations: rendered server-side, client strings via a fingerprinted bundle
+# ------------------------
+@app.context_processor
+def inject_translations():
+    language = request_language()
+    fingerprint, _ = get_catalogs().bundles[language]
+    return {
+        "t": get_catalogs().catalog(language),
+        "language": language,
+        "i18n_bundle_url": f"/df/i18n/{language}.{fingerprint}.js",
+    }
+
+
+@app.route("/df/i18n/<language>.<fingerprint>.js", methods=["GET"])
+def i18n_bundle(language, fingerprint):
+    """Client-side strings for one language; immutable under a matching fingerprint"""
+    bundles = get_catalogs().bundles
+    if language not in bundles:
+        abort(404)
+    current, body = bundles[language]
+    response = Response(body, mimetype="text/javascript")
+    # a page rendered before a deploy may ask for an old fingerprint: answer, but do not pin it
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable" if fingerprint == current else "no-cache"
+    return response
+
+# -------------------- PROBLEM STATUS --------------------
+# problems.current_status / last_step_at are kept current by triggers on
+# problem_steps (init_db.sql); a problem without steps is Open, so the status is
+# never NULL. The open/closed predicates match the partial indexes there, so
+# keep them textually identical.
+CLOSED_STATUSES = ("Finished", "Cancel")
+STATUS_FILTERS = ("open", "closed")
+
+
+def status_condition(value, alias="p"):
+    """
+    (SQL condition, params) for a ?status= filter: "open", "closed" or one
+    status value. (None, []) when there is nothing to filter on.
+    """
+    if not value:
+        return None, []
+    if value == "open":
+        return f"{alias}.current_status NOT IN ('Finished', 'Cancel')", []
+    if value == "closed":
+        return f"{alias}.current_status IN ('Finished', 'Cancel')", []
+    return f"{alias}.current_status = %s", [value]
+
+
 # -------------------- HOME --------------------
+HOME_PAGE_SIZE = 50
+
+
 @app.route("/df/", methods=["GET"])
 @app.route("/df/df", methods=["GET"])
 @login_required
 def index():
     user_id = session.get("user_id")
-    problems = db.execute("""
+    cursor = request.args.get("cursor")
+    status_filter = (request.args.get("status") or "").strip()
+
+    conditions = ["p.user_id = %s"]
+    params = [user_id]
+    condition, status_params = status_condition(status_filter)
+    if condition:
+        conditions.append(condition)
+        params.extend(status_params)
+    if cursor:
+        try:
+            params.extend(decode_cursor(cursor))
+        except ValueError:
+            return redirect("/df/")
+        conditions.append("(p.created_at, p.id) < (%s, %s)")
+
+    # One row per problem: components (with their photos) are aggregated
+    # into JSON so steps and components never multiply each other's rows
+    data = db.execute(f"""
         SELECT 
             p.id AS problem_id,
             p.created_at,
+            p.current_status,
+            p.last_step_at,
             pj.project_number,
             pj.project_name,
             m.manager_name,
@@ -71,75 +252,54 @@ def index():
             g.group_name,
             g.group_number,
             e.engineer_name,
-            pc.id AS pc_id,
-            comp.component_name,
-            comp.component_no,
-            pc.reason,
-            pc.description,
-            pc.priority,
-            pc.action,
-            pc.department,
-            ps.df_filename
+            (
+                SELECT ps.df_filename
+                FROM problem_steps ps
+                WHERE ps.problem_id = p.id
+                ORDER BY ps.step_number, ps.id
+                LIMIT 1
+            ) AS df_filename,
+            COALESCE((
+                SELECT json_agg(json_build_object(
+                    'pc_id', pc.id,
+                    'component_name', comp.component_name,
+                    'component_no', comp.component_no,
+                    'reason', pc.reason,
+                    'description', pc.description,
+                    'priority', pc.priority,
+                    'action', pc.action,
+                    'department', pc.department,
+                    'photos', COALESCE((
+                        SELECT json_agg(json_build_object(
+                            'file_path', ph.file_path,
+                            'thumb_path', COALESCE(ph.thumb_path, ph.file_path)
+                        ) ORDER BY ph.id)
+                        FROM problem_photos ph
+                        WHERE ph.problem_component_id = pc.id
+                    ), '[]'::json)
+                ) ORDER BY pc.id)
+                FROM problem_components pc
+                LEFT JOIN components comp ON comp.id = pc.component_id
+                WHERE pc.problem_id = p.id
+            ), '[]'::json) AS components
         FROM problems p
         JOIN projects pj ON pj.id = p.project_id
         JOIN managers m ON pj.manager_id = m.id
         JOIN customers c ON pj.customer_id = c.id
         JOIN groups g ON g.id = p.group_id
         JOIN engineers e ON g.engineer_id = e.id
-        LEFT JOIN problem_components pc ON pc.problem_id = p.id
-        LEFT JOIN components comp ON comp.id = pc.component_id
-        LEFT JOIN problem_steps ps ON ps.problem_id = p.id
-        WHERE p.user_id = %s
-        ORDER BY p.created_at DESC
-    """, user_id)
-
-    problem_dict = defaultdict(lambda: {"components": []})
-
-    for row in problems:
-        prob = problem_dict[row["problem_id"]]
-        prob.update({
-            "problem_id": row["problem_id"],
-            "created_at": row["created_at"],
-            "project_number": row["project_number"],
-            "project_name": row["project_name"],
-            "manager_name": row["manager_name"],
-            "customer_name": row["customer_name"],
-            "group_name": row["group_name"],
-            "group_number": row["group_number"],
-            "engineer_name": row["engineer_name"],
-            "df_filename": row["df_filename"]
-        })
-        if row["pc_id"]:
-            prob["components"].append({
-                "pc_id": row["pc_id"],
-                "component_name": row["component_name"],
-                "component_no": row["component_no"],
-                "reason": row["reason"],
-                "description": row["description"],
-                "priority": row["priority"],
-                "action": row["action"],
-                "department": row["department"],
-                "photos": []  # Will be populated below
-            })
-
-    # Attach photos from filesystem per component
-    for prob in problem_dict.values():
-        df_prefix = prob["df_filename"].split(".")[0] if prob["df_filename"] else None
-        if df_prefix:
-            problem_base_dir = os.path.join(UPLOADS_DIR, df_prefix)
-            if os.path.exists(problem_base_dir):
-                # Look for component-specific photo folders
-                for comp in prob["components"]:
-                    component_photos_dir = os.path.join(problem_base_dir, f"component_{comp['pc_id']}", "pictures")
-                    if os.path.exists(component_photos_dir):
-                        comp["photos"] = [f for f in os.listdir(component_photos_dir) 
-                                         if os.path.isfile(os.path.join(component_photos_dir, f))]
-                    else:
-                        comp["photos"] = []
+        WHERE {" AND ".join(conditions)}
+        ORDER BY p.created_at DESC, p.id DESC
+        LIMIT %s
+    """, *params, HOME_PAGE_SIZE + 1)
+
+    next_cursor = None
+    if len(data) > HOME_PAGE_SIZE:
+        data = data[:HOME_PAGE_SIZE]
+        next_cursor = encode_cursor(data[-1]["created_at"], data[-1]["problem_id"])
 
-    data = list(problem_dict.values())
-    t = get_translations()
-    return render_template("home.html", data=data, t=t)
+    return render_template("home.html", data=data, next_cursor=next_cursor, is_first_page=not cursor,
+                           status_filter=status_filter)
 
 
 # -------------------- LOGIN --------------------
@@ -196,17 +356,11 @@ def register():
 def upload():
     user_id = session.get("user_id")
     # --- fetch dropdowns and DB references (always defined for GET and POST) ---
-    managers = db.execute("SELECT id, manager_name, manager_mail FROM managers")
-    customers = db.execute("SELECT id, customer_name, customer_country FROM customers")
+    managers = ref_cache.get("managers")
+    customers = ref_cache.get("customers")
     # Filter projects by user_id if user is not admin
     if session.get("role") == "admin":
-        projects = db.execute("""
-            SELECT p.id, p.project_number, p.project_name, p.quantity,
-                   p.manager_id, m.manager_name, c.customer_name
-            FROM projects p
-            JOIN managers m ON p.manager_id = m.id
-            JOIN customers c ON p.customer_id = c.id
-        """)
+        projects = ref_cache.get("projects")
     else:
         # For non-admin users, only show projects they have access to
         projects = db.execute("""
@@ -218,17 +372,8 @@ def upload():
             JOIN problems pr ON pr.project_id = p.id
             WHERE pr.user_id = %s
         """, user_id)
-    groups = db.execute("""
-        SELECT g.id, g.project_id, e.engineer_name,
-               g.group_number, g.group_name
-        FROM groups g
-        JOIN engineers e ON g.engineer_id = e.id
-    """)
-    components = db.execute("""
-        SELECT c.id, c.group_id, c.component_no, c.component_name,
-               c.unit_quantity, c.total_quantity
-        FROM components c
-    """)
+    # groups and components are fetched on demand from /df/projects/<id>/groups
+    # and /df/groups/<id>/components once a project / group is picked
 
     # dropdown constants (from your module)
     dropdown_reasons = reasons
@@ -239,8 +384,6 @@ def upload():
     dropdown_smth = smth
     dropdown_talep = talep
 
-    t = get_translations()
-
     def parse_components_from_form(form):
         """
         Supports two shapes:
@@ -306,59 +449,84 @@ def upload():
         timestamp = datetime.now().strftime("%d%m%y%H%M%S")
         df_number = f"df_{timestamp}"
         folder_name = df_number
-        base_dir = os.path.join(UPLOADS_DIR, folder_name)
-        os.makedirs(base_dir, exist_ok=True)
-
-        # ---- Insert main problems row ----
-        db.execute("""
-            INSERT INTO problems (project_id, group_id, user_id, planned_closing_date)
-            VALUES (%s, %s, %s, %s)
-        """, project_id, group_id, session.get("user_id"), planned_closing_date)
-
-        # get inserted problem id
-        result = db.execute("SELECT id FROM problems WHERE project_id = %s AND group_id = %s AND user_id = %s ORDER BY id DESC LIMIT 1", 
-                           project_id, group_id, session.get("user_id"))
-        problem_id = result[0]["id"] if result else None
-
-        # ---- Insert problem_components and problem_steps per component ----
-        for idx, comp in enumerate(components_list):
-            comp_id = comp.get("component_id") or comp.get("component") or None
-            reason_v = comp.get("reason")
-            department_v = comp.get("department")
-            action_v = comp.get("action")
-            priority_v = comp.get("priority")
-            description_v = comp.get("description")
-
-            # Insert problem_component
-            db.execute("""
-                INSERT INTO problem_components
-                (problem_id, component_id, reason, department, action, priority, description)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, problem_id, comp_id, reason_v, department_v, action_v, priority_v, description_v)
-
-            # Get the inserted problem_component id
-            result = db.execute("SELECT id FROM problem_components WHERE problem_id = %s AND component_id = %s ORDER BY id DESC LIMIT 1",
-                               problem_id, comp_id)
-            problem_component_id = result[0]["id"] if result else None
-
-            # ---- Save photos for this component ----
-            component_photos = request.files.getlist(f"components[{idx}][photos]")
-            if component_photos and any(photo.filename for photo in component_photos):
-                component_pictures_dir = os.path.join(base_dir, f"component_{problem_component_id}", "pictures")
-                os.makedirs(component_pictures_dir, exist_ok=True)
-                
-                for photo_idx, photo in enumerate(component_photos, start=1):
-                    if photo and photo.filename:
-                        ext = os.path.splitext(photo.filename)[1] or ".jpg"
-                        filename = secure_filename(f"comp_{problem_component_id}_{photo_idx}{ext}")
-                        photo.save(os.path.join(component_pictures_dir, filename))
-
-            # add initial step row for that component (adjust fields to your schema)
-            db.execute("""
-                INSERT INTO problem_steps
-                (problem_id, component_id, step_number, df_filename, quantity, action, status, planned_closing_date)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """, problem_id, comp_id, 1, f"{df_number}.xlsx", 0, action_v or "Initial", "Open", planned_closing_date)
+        photo_ids = []
+
+        try:
+            # the whole report is one transaction: a handful of round-trips however many components
+            with db.transaction() as tx:
+                # ---- Insert main problems row ----
+                problem_id = tx.execute("""
+                    INSERT INTO problems (project_id, group_id, user_id, planned_closing_date)
+                    VALUES (%s, %s, %s, %s)
+                    RETURNING id
+                """, project_id, group_id, session.get("user_id"), planned_closing_date)[0]["id"]
+
+                if components_list:
+                    # Reserve problem_component ids up front: photo folders are named after them,
+                    # and sorting keeps them in form order regardless of how the rows come back
+                    pc_ids = sorted(row["id"] for row in tx.execute("""
+                        SELECT nextval(pg_get_serial_sequence('problem_components', 'id')) AS id
+                        FROM generate_series(1, %s)
+                    """, len(components_list)))
+
+                    component_rows = []
+                    step_rows = []
+                    photo_rows = []
+                    photo_files = []
+                    for idx, (comp, problem_component_id) in enumerate(zip(components_list, pc_ids)):
+                        comp_id = comp.get("component_id") or comp.get("component") or None
+                        action_v = comp.get("action")
+                        component_rows.append((
+                            problem_component_id, problem_id, comp_id, comp.get("reason"), comp.get("department"),
+                            action_v, comp.get("priority"), comp.get("description")
+                        ))
+                        # initial step row for that component
+                        step_rows.append((
+                            problem_id, comp_id, 1, f"{df_number}.xlsx", 0, action_v or "Initial", "Open", planned_closing_date
+                        ))
+
+                        # ---- Save photos for this component ----
+                        component_photos = request.files.getlist(f"components[{idx}][photos]")
+                        if component_photos and any(photo.filename for photo in component_photos):
+                            for photo_idx, photo in enumerate(component_photos, start=1):
+                                if photo and photo.filename:
+                                    ext = os.path.splitext(photo.filename)[1] or ".jpg"
+                                    filename = secure_filename(f"comp_{problem_component_id}_{photo_idx}{ext}")
+                                    file_path = f"{folder_name}/component_{problem_component_id}/pictures/{filename}"
+                                    photo_files.append((file_path, photo.stream))
+                                    photo_rows.append((problem_id, problem_component_id, file_path))
+
+                    # identical photos (re-submissions) share one blob on disk; two statements for all of them
+                    storage.save_many(tx, photo_files)
+
+                    tx.execute_values("""
+                        INSERT INTO problem_components
+                        (id, problem_id, component_id, reason, department, action, priority, description)
+                        VALUES %s
+                    """, component_rows)
+                    tx.execute_values("""
+                        INSERT INTO problem_steps
+                        (problem_id, component_id, step_number, df_filename, quantity, action, status, planned_closing_date)
+                        VALUES %s
+                    """, step_rows)
+                    photo_ids = [row["id"] for row in tx.execute_values("""
+                        INSERT INTO problem_photos (problem_id, problem_component_id, file_path)
+                        VALUES %s
+                        ON CONFLICT (file_path) DO NOTHING
+                        RETURNING id
+                    """, photo_rows, fetch=True)]
+        except Exception as e:
+            # nothing was committed; blobs written for this report are left to `flask gc-uploads`
+            flash(f"Error saving problem report: {str(e)}", "error")
+            return redirect("/df/upload")
+
+        # thumbnails are rendered by the worker; listings show originals until then
+        if photo_ids:
+            try:
+                enqueue(db, "photo_variants", {"photo_ids": photo_ids, "uploads_dir": UPLOADS_DIR}, session.get("user_id"))
+            except Exception as e:
+                app.logger.warning("Could not queue photo variants for problem %s: %s", problem_id, e)
+        queue_reports([problem_id])
 
         flash("Problem reported successfully!", "success")
         return redirect("/df/")
@@ -369,8 +537,6 @@ def upload():
         "upload.html",
         data={
             "projects": projects,
-            "groups": groups,
-            "components": components,
             "managers": managers,
             "customers": customers
         },
@@ -379,19 +545,146 @@ def upload():
         action=action,
         status = status,
         priority=priority,
-        t=t,
         smth=smth,
         talep=talep
     )
 
 
+COMPONENT_SEARCH_LIMIT = 50
+COMPONENT_SEARCH_MAX_LIMIT = 500
+
+
+@app.route("/df/projects/<int:project_id>/groups", methods=["GET"])
+@login_required
+def project_groups(project_id):
+    """Groups of one project, for the upload form"""
+    return jsonify(groups_by_project().get(project_id, []))
+
+
+@app.route("/df/groups/<int:group_id>/components", methods=["GET"])
+@login_required
+def group_components(group_id):
+    """Components of one group, optionally filtered by ?q= on number or name"""
+    q = (request.args.get("q") or "").strip()
+    limit = request.args.get("limit", COMPONENT_SEARCH_LIMIT, type=int)
+    limit = max(1, min(limit, COMPONENT_SEARCH_MAX_LIMIT))
+
+    conditions = ["c.group_id = %s"]
+    params = [group_id]
+    if q:
+        pattern = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        conditions.append("(c.component_no ILIKE %s OR c.component_name ILIKE %s)")
+        params.extend([pattern, pattern])
+
+    components = db.execute(f"""
+        SELECT c.id, c.component_no, c.component_name,
+               c.unit_quantity, c.total_quantity
+        FROM components c
+        WHERE {" AND ".join(conditions)}
+        ORDER BY c.component_no, c.id
+        LIMIT %s
+    """, *params, limit)
+    return jsonify(components)
+
+
+SUGGEST_LIMIT = 10
+SUGGEST_MAX_LIMIT = 50
+# below this many characters trigrams say little, so only prefixes are matched
+SUGGEST_FUZZY_MIN_LENGTH = 3
+
+
+def suggest_components(group_id, q, limit):
+    """
+    Prefix matches on component no / name first (text_pattern_ops indexes),
+    then, if there is room, trigram matches that tolerate typos.
+    """
+    prefix = q.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    # not prepared: only a plan made with the pattern known can use the prefix indexes
+    rows = db.execute("""
+        SELECT id, component_no, component_name, unit_quantity, total_quantity
+        FROM components
+        WHERE group_id = %s
+          AND (lower(component_no) LIKE %s OR lower(component_name) LIKE %s)
+        ORDER BY component_no, id
+        LIMIT %s
+    """, group_id, prefix, prefix, limit, prepare=False)
+
+    if len(rows) < limit and len(q) >= SUGGEST_FUZZY_MIN_LENGTH:
+        rows += db.execute("""
+            SELECT id, component_no, component_name, unit_quantity, total_quantity
+            FROM components
+            WHERE group_id = %s
+              AND (component_no %% %s OR %s <%% component_name)
+              AND id <> ALL(%s)
+            ORDER BY GREATEST(similarity(component_no, %s), word_similarity(%s, component_name)) DESC,
+                     component_no, id
+            LIMIT %s
+        """, group_id, q, q, [row["id"] for row in rows], q, q, limit - len(rows))
+    return rows
+
+
+@app.route("/df/groups/<int:group_id>/components/suggest", methods=["GET"])
+@login_required
+def group_component_suggestions(group_id):
+    """Typeahead for the upload form: components of one group matching ?q="""
+    q = (request.args.get("q") or "").strip()[:100]
+    limit = max(1, min(request.args.get("limit", SUGGEST_LIMIT, type=int), SUGGEST_MAX_LIMIT))
+    if not q:
+        return jsonify([])
+
+    suggestions = component_suggestions.get(
+        (group_id, q.lower(), limit), lambda: suggest_components(group_id, q, limit))
+    response = jsonify(suggestions)
+    # the same prefix is asked for again as the user edits; components rarely change
+    response.headers["Cache-Control"] = "private, max-age=60"
+    return response
+
+
+# -------------------- DF REPORTS --------------------
+def queue_reports(problem_ids):
+    """Have the worker (re)render the DF workbooks of these problems; unchanged ones are skipped there."""
+    problem_ids = [int(pid) for pid in problem_ids if pid]
+    if not problem_ids:
+        return
+    try:
+        enqueue(db, "df_report", {"problem_ids": problem_ids, "uploads_dir": UPLOADS_DIR, "reports_dir": REPORTS_DIR},
+                session.get("user_id"))
+    except Exception as e:
+        app.logger.warning("Could not queue DF reports for problems %s: %s", problem_ids, e)
+
+
+@app.route("/df/problems/<int:problem_id>/report.xlsx", methods=["GET"])
+@login_required
+def problem_report(problem_id):
+    """The problem's DF workbook, as last rendered by the worker"""
+    path, data = current_report(db, REPORTS_DIR, problem_id)
+    if data is None:
+        abort(404)
+    if data["problem"]["user_id"] != session.get("user_id") and session.get("role") != "admin":
+        abort(403)
+    if path is None:
+        queue_reports([problem_id])
+        flash(f"{data['df_number']}.xlsx is being generated, please try again in a moment.", "info")
+        return redirect("/df/admin?tab=problems" if session.get("role") == "admin" else "/df/")
+
+    # the file is rewritten in place when the problem changes, so revalidate on the signature
+    response = send_file(path, as_attachment=True, download_name=f"{data['df_number']}.xlsx",
+                         conditional=True, etag=data["problem"]["report_signature"])
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
 # -------------------- INFO --------------------
 @app.route("/df/info", methods=["GET"])
 @login_required
 def info():
     user_id = session.get("user_id")
+    status_filter = (request.args.get("status") or "").strip()
+    condition, status_params = status_condition(status_filter, alias="pr")
+    problem_join = "pr.project_id = p.id AND pr.user_id = %s" + (f" AND {condition}" if condition else "")
+
     # Single query to get managers -> projects -> problems (filtered by user_id)
-    rows = db.execute("""
+    rows = db.execute(f"""
         SELECT
             m.id AS manager_id,
             m.manager_name,
@@ -399,17 +692,39 @@ def info():
             p.project_number,
             p.quantity,
             pr.id AS problem_id,
-            pr.df_number,
-            pr.reason,
-            pr.description AS problem_description,
-            pr.photos_id,
-            pr.status,
-            pr.record_date
+            pr.current_status,
+            pr.last_step_at,
+            pr.created_at AS record_date,
+            (
+                SELECT ps.df_filename
+                FROM problem_steps ps
+                WHERE ps.problem_id = pr.id
+                ORDER BY ps.step_number, ps.id
+                LIMIT 1
+            ) AS df_filename,
+            (
+                SELECT string_agg(DISTINCT pc.reason, ', ')
+                FROM problem_components pc
+                WHERE pc.problem_id = pr.id
+            ) AS reason,
+            (
+                SELECT string_agg(pc.description, ' / ' ORDER BY pc.id)
+                FROM problem_components pc
+                WHERE pc.problem_id = pr.id
+            ) AS problem_description,
+            (
+                SELECT json_agg(json_build_object(
+                    'file_path', ph.file_path,
+                    'thumb_path', COALESCE(ph.thumb_path, ph.file_path)
+                ) ORDER BY ph.id)
+                FROM problem_photos ph
+                WHERE ph.problem_id = pr.id
+            ) AS photos
         FROM managers m
         LEFT JOIN projects p ON p.manager_id = m.id
-        LEFT JOIN problems pr ON pr.project_id = p.id AND pr.user_id = %s
-        ORDER BY m.manager_name, p.project_number, pr.record_date DESC
-    """, user_id)
+        LEFT JOIN problems pr ON {problem_join}
+        ORDER BY m.manager_name, p.project_number, pr.created_at DESC
+    """, user_id, *status_params)
 
 
     # Build nested structure: { manager_name: [ { project }, { project }, ... ] }
@@ -445,44 +760,384 @@ def info():
 
             # append problem if exists
             if row["problem_id"]:
-                photos = []
-                if row["photos_id"]:
-                    # photos stored as comma-separated filenames
-                    photos = [p.strip() for p in row["photos_id"].split(",") if p.strip()]
-
+                df_filename = row.get("df_filename")
                 problem_obj = {
                     "id": row["problem_id"],
-                    "df_number": row.get("df_number"),
+                    "df_number": os.path.splitext(df_filename)[0] if df_filename else None,
                     "reason": row.get("reason"),
                     "description": row.get("problem_description"),
-                    "photos": photos,
-                    "status": row.get("status"),
+                    "photos": row.get("photos") or [],
+                    "status": row.get("current_status"),
+                    "last_step_at": row.get("last_step_at"),
                     "record_date": row.get("record_date")
                 }
                 project_index[manager][project_id]["problems"].append(problem_obj)
 
     # ensure managers with no projects still show up (data[manager] would be empty list)
-    t = get_translations() if callable(globals().get("get_translations", None)) else {}
-
-    return render_template("info.html", data=data, t=t)
+    return render_template("info.html", data=data, status_filter=status_filter)
 
 # -------------------- HISTORY --------------------
-@app.route("/df/history", methods=["GET"])
-@login_required
-def history():
-    rows = db.execute("""
-        SELECT ps.df_filename, p.project_number, m.manager_name, pr.reason, pr.description, pr.photos_id, ps.created_at
+HISTORY_PAGE_SIZE = 100
+HISTORY_EXPORT_COLUMNS = (
+    ("created_at", "Date"),
+    ("df_filename", "DF File"),
+    ("project_number", "Project"),
+    ("manager_name", "Manager"),
+    ("step_number", "Step"),
+    ("status", "Status"),
+    ("action", "Action"),
+    ("reason", "Reason"),
+    ("description", "Description"),
+)
+
+
+def history_query(args, cursor=None, limit=None):
+    """
+    SELECT for history rows matching ?project_id= / ?manager_id=, newest
+    first, optionally after a keyset cursor. Returns (query, params).
+    Raises ValueError for filters or cursors that do not parse.
+    """
+    conditions, params = [], []
+    for key, column in (("project_id", "pr.project_id"), ("manager_id", "p.manager_id")):
+        value = (args.get(key) or "").strip()
+        if value:
+            conditions.append(f"{column} = %s")
+            params.append(int(value))
+    if cursor:
+        conditions.append("(ps.created_at, ps.id) < (%s, %s)")
+        params.extend(decode_cursor(cursor))
+
+    # reason/description live on the report's entry for the step's component
+    query = f"""
+        SELECT ps.id, ps.created_at, ps.df_filename, ps.step_number, ps.status, ps.action,
+               p.project_number, m.manager_name, pc.reason, pc.description
         FROM problem_steps ps
         JOIN problems pr ON ps.problem_id = pr.id
         JOIN projects p ON pr.project_id = p.id
         JOIN managers m ON p.manager_id = m.id
-        ORDER BY ps.created_at DESC
-    """)
-    t = get_translations()
-    return render_template("history.html", data=rows, t=t)
+        LEFT JOIN LATERAL (
+            SELECT reason, description
+            FROM problem_components
+            WHERE problem_id = ps.problem_id AND component_id = ps.component_id
+            ORDER BY id
+            LIMIT 1
+        ) pc ON TRUE
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        ORDER BY ps.created_at DESC, ps.id DESC
+    """
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, params
+
+
+@app.route("/df/history", methods=["GET"])
+@login_required
+def history():
+    cursor = request.args.get("cursor")
+    try:
+        query, params = history_query(request.args, cursor, HISTORY_PAGE_SIZE + 1)
+    except ValueError:
+        flash("Invalid history filter.", "error")
+        return redirect("/df/history")
+    rows = db.execute(query, *params)
+
+    next_cursor = None
+    if len(rows) > HISTORY_PAGE_SIZE:
+        rows = rows[:HISTORY_PAGE_SIZE]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+
+    filters = {key: request.args.get(key, "") for key in ("project_id", "manager_id")}
+    return render_template(
+        "history.html",
+        data=rows,
+        next_cursor=next_cursor,
+        is_first_page=not cursor,
+        filters=filters,
+        filter_query=urlencode({k: v for k, v in filters.items() if v}),
+        projects=ref_cache.get("projects"),
+        managers=ref_cache.get("managers"),
+    )
+
+
+@app.route("/df/history/export", methods=["GET"])
+@login_required
+def history_export():
+    """All matching history rows as CSV (streamed) or XLSX, read through a server-side cursor"""
+    export_format = request.args.get("format", "csv")
+    try:
+        query, params = history_query(request.args)
+    except ValueError:
+        abort(400)
+    filename = f"history_{datetime.now():%Y%m%d_%H%M%S}"
+
+    if export_format == "csv":
+        def generate():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow([title for _, title in HISTORY_EXPORT_COLUMNS])
+            for n, row in enumerate(db.iterate(query, *params), start=1):
+                writer.writerow([row[key] for key, _ in HISTORY_EXPORT_COLUMNS])
+                if n % 1000 == 0:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype="text/csv",
+            headers={"Content-Disposition": f"attachment; filename={filename}.csv"},
+        )
+
+    if export_format == "xlsx":
+        # write-only mode keeps one row in memory; the zip is assembled in a temp file
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("History")
+        sheet.append([title for _, title in HISTORY_EXPORT_COLUMNS])
+        for row in db.iterate(query, *params):
+            sheet.append([row[key] for key, _ in HISTORY_EXPORT_COLUMNS])
+        output = tempfile.TemporaryFile()
+        workbook.save(output)
+        output.seek(0)
+        return send_file(
+            output,
+            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            as_attachment=True,
+            download_name=f"{filename}.xlsx",
+        )
+
+    abort(400)
+
+# -------------------- SEARCH --------------------
+SEARCH_PAGE_SIZE = 25
+SEARCH_MAX_PAGES = 40
+# Each way of matching contributes at most this many candidates to be ranked,
+# which bounds the cost of very broad terms
+SEARCH_CANDIDATES = 2000
+
+
+@app.route("/df/search", methods=["GET"])
+@login_required
+def search():
+    """Reported components ranked by how well their description or part matches ?q="""
+    q = (request.args.get("q") or "").strip()[:200]
+    page = max(1, min(request.args.get("page", 1, type=int), SEARCH_MAX_PAGES))
+
+    rows = []
+    if len(q) >= 2:
+        # full text on descriptions and component no/name (GIN on search_vector);
+        # trigram similarity catches typos in part numbers and names (GIN trgm
+        # indexes). The matching conditions take the term directly so the
+        # planner can use those indexes; `query` only feeds the ranking.
+        rows = db.execute("""
+            WITH query AS (
+                SELECT websearch_to_tsquery('simple', %s) AS ts, %s::text AS term
+            ),
+            matches AS (
+                (
+                    SELECT pc.id
+                    FROM problem_components pc
+                    WHERE pc.search_vector @@ websearch_to_tsquery('simple', %s)
+                    LIMIT %s
+                )
+                UNION
+                (
+                    SELECT pc.id
+                    FROM components c
+                    JOIN problem_components pc ON pc.component_id = c.id
+                    WHERE c.search_vector @@ websearch_to_tsquery('simple', %s)
+                       OR c.component_no %% %s
+                       OR %s <%% c.component_name
+                    LIMIT %s
+                )
+            )
+            SELECT pc.id, pc.problem_id, pc.description, pc.reason,
+                   c.component_no, c.component_name,
+                   pj.project_number, pj.project_name, p.user_id, p.created_at,
+                   (
+                       SELECT ps.df_filename
+                       FROM problem_steps ps
+                       WHERE ps.problem_id = p.id
+                       ORDER BY ps.step_number, ps.id
+                       LIMIT 1
+                   ) AS df_filename,
+                   ts_rank(pc.search_vector, query.ts)
+                     + ts_rank(c.search_vector, query.ts)
+                     + similarity(c.component_no, query.term)
+                     + word_similarity(query.term, c.component_name) AS rank
+            FROM matches
+            JOIN problem_components pc ON pc.id = matches.id
+            JOIN components c ON pc.component_id = c.id
+            JOIN problems p ON pc.problem_id = p.id
+            JOIN projects pj ON p.project_id = pj.id
+            CROSS JOIN query
+            ORDER BY rank DESC NULLS LAST, p.created_at DESC, pc.id DESC
+            LIMIT %s OFFSET %s
+        """, q, q, q, SEARCH_CANDIDATES, q, q, q, SEARCH_CANDIDATES,
+            SEARCH_PAGE_SIZE + 1, (page - 1) * SEARCH_PAGE_SIZE)
+
+    has_next = len(rows) > SEARCH_PAGE_SIZE and page < SEARCH_MAX_PAGES
+    return render_template(
+        "search.html",
+        q=q,
+        results=rows[:SEARCH_PAGE_SIZE],
+        page=page,
+        has_next=has_next,
+    )
+
 
 # -------------------- ADMIN --------------------
 
+PROBLEMS_PAGE_SIZE = 50
+
+
+def parse_problem_filters(args):
+    """
+    Read the problems-tab filters from a query string.
+    Raises ValueError for ids or dates that do not parse.
+    """
+    filters = {}
+    for key in ("project_id", "group_id", "user_id"):
+        value = (args.get(key) or "").strip()
+        if value:
+            int(value)
+        filters[key] = value
+    filters["status"] = (args.get("status") or "").strip()
+    for key in ("date_from", "date_to"):
+        value = (args.get(key) or "").strip()
+        if value:
+            datetime.strptime(value, "%Y-%m-%d")
+        filters[key] = value
+    return filters
+
+
+def fetch_problems_page(filters, cursor=None, limit=PROBLEMS_PAGE_SIZE):
+    """
+    One page of problems, newest first, using keyset pagination over
+    (created_at, id). Returns (reports, next_cursor); next_cursor is None
+    on the last page.
+    """
+    conditions = []
+    params = []
+    if filters.get("project_id"):
+        conditions.append("p.project_id = %s")
+        params.append(int(filters["project_id"]))
+    if filters.get("group_id"):
+        conditions.append("p.group_id = %s")
+        params.append(int(filters["group_id"]))
+    if filters.get("user_id"):
+        conditions.append("p.user_id = %s")
+        params.append(int(filters["user_id"]))
+    condition, status_params = status_condition(filters.get("status"))
+    if condition:
+        conditions.append(condition)
+        params.extend(status_params)
+    if filters.get("date_from"):
+        conditions.append("p.created_at >= %s")
+        params.append(datetime.strptime(filters["date_from"], "%Y-%m-%d"))
+    if filters.get("date_to"):
+        conditions.append("p.created_at < %s")
+        params.append(datetime.strptime(filters["date_to"], "%Y-%m-%d") + timedelta(days=1))
+    if cursor:
+        conditions.append("(p.created_at, p.id) < (%s, %s)")
+        params.extend(decode_cursor(cursor))
+
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+    # fetch one extra row to know whether another page exists
+    problems = db.execute(f"""
+        SELECT p.id, p.created_at, p.planned_closing_date, p.current_status, p.last_step_at,
+               pr.project_number, pr.project_name,
+               g.group_name,
+               u.username
+        FROM problems p
+        JOIN projects pr ON p.project_id = pr.id
+        JOIN groups g ON p.group_id = g.id
+        JOIN users u ON p.user_id = u.id
+        {where}
+        ORDER BY p.created_at DESC, p.id DESC
+        LIMIT %s
+    """, *params, limit + 1)
+
+    next_cursor = None
+    if len(problems) > limit:
+        problems = problems[:limit]
+        next_cursor = encode_cursor(problems[-1]["created_at"], problems[-1]["id"])
+
+    problem_ids = [prob["id"] for prob in problems]
+    if not problem_ids:
+        return [], None
+
+    problem_components = db.execute("""
+        SELECT pc.id, pc.problem_id, c.component_name, pc.reason, pc.priority,
+               pc.department, pc.action
+        FROM problem_components pc
+        JOIN components c ON pc.component_id = c.id
+        WHERE pc.problem_id = ANY(%s)
+        ORDER BY pc.problem_id, pc.id
+    """, problem_ids)
+    steps = db.execute("""
+        SELECT id, step_number, df_filename, status, action, problem_id
+        FROM problem_steps
+        WHERE problem_id = ANY(%s)
+        ORDER BY problem_id, step_number
+    """, problem_ids)
+
+    components_by_problem = defaultdict(list)
+    for comp in problem_components:
+        components_by_problem[comp["problem_id"]].append(comp)
+
+    steps_by_problem = defaultdict(list)
+    for step in steps:
+        steps_by_problem[step["problem_id"]].append(step)
+
+    reports = []
+    for prob in problems:
+        reports.append({
+            **prob,
+            "components": components_by_problem.get(prob["id"], []),
+            "steps": steps_by_problem.get(prob["id"], [])
+        })
+    return reports, next_cursor
+
+
+def release_photo_files(tx, photos):
+    """Drop the blob references of deleted problem_photos rows (originals and variants)"""
+    storage.delete_many(tx, [
+        photo[key] for photo in photos for key in ("file_path", "thumb_path", "web_path") if photo[key]
+    ])
+
+
+def groups_by_project():
+    """project id -> its groups, from the reference cache"""
+    def load():
+        by_project = defaultdict(list)
+        for grp in ref_cache.get("groups"):
+            by_project[grp["project_id"]].append(grp)
+        return by_project
+    return ref_cache.get("groups_by_project", load)
+
+
+def build_project_tree():
+    """Projects -> groups -> components, stitched together from the cached lists"""
+    components_by_group = defaultdict(list)
+    for comp in ref_cache.get("components"):
+        components_by_group[comp["group_id"]].append(comp)
+
+    groups = groups_by_project()
+    return [
+        {
+            **proj,
+            "groups": [
+                {**grp, "components": components_by_group.get(grp["id"], [])}
+                for grp in groups.get(proj["id"], [])
+            ],
+        }
+        for proj in ref_cache.get("projects")
+    ]
+
+
 @app.route("/df/admin", methods=["GET", "POST"])
 @admin_required
 def admin():
@@ -566,7 +1221,16 @@ def admin():
                         except Exception as e:
                             flash(f"Error deleting project: {str(e)}", "error")
 
-            elif action == "upload_excel":
+            elif action in ("upload_excel", "upload_bom"):
+                if action == "upload_bom":
+                    group_id = request.form.get("group_id")
+                    if not group_id or not group_id.isdigit():
+                        flash("Please choose the group to import components into.", "error")
+                        return redirect("/df/admin?tab=projects")
+                    kind, payload = "import_components", {"group_id": int(group_id)}
+                else:
+                    kind, payload = "import_projects", {}
+
                 if 'excel_file' not in request.files:
                     flash("No file uploaded.", "error")
                     return redirect("/df/admin?tab=projects")
@@ -580,87 +1244,38 @@ def admin():
                     flash("Please upload an Excel file (.xlsx or .xls).", "error")
                     return redirect("/df/admin?tab=projects")
 
-                try:
-                    # Save temporary file
-                    temp_dir = os.path.join(UPLOADS_DIR, "temp")
-                    os.makedirs(temp_dir, exist_ok=True)
-                    temp_path = os.path.join(temp_dir, secure_filename(file.filename))
-                    file.save(temp_path)
-
-                    # Load workbook
-                    wb = load_workbook(temp_path)
-                    ws = wb.active
-
-                    # Get managers and customers for lookup
-                    managers_dict = {m['manager_name']: m['id'] for m in db.execute("SELECT id, manager_name FROM managers")}
-                    customers_dict = {f"{c['customer_name']}": c['id'] for c in db.execute("SELECT id, customer_name FROM customers")}
-
-                    # Read rows (assuming first row is header)
-                    rows_processed = 0
-                    errors = []
-                    for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-                        if not any(row):  # Skip empty rows
-                            continue
-
-                        try:
-                            project_number = str(row[0]).strip() if row[0] else None
-                            project_name = str(row[1]).strip() if row[1] else None
-                            manager_name = str(row[2]).strip() if row[2] else None
-                            customer_name = str(row[3]).strip() if row[3] else None
-                            quantity = row[4] if row[4] else None
-
-                            if not all([project_number, project_name, manager_name, customer_name, quantity]):
-                                errors.append(f"Row {idx}: Missing required fields")
-                                continue
-
-                            manager_id = managers_dict.get(manager_name)
-                            customer_id = customers_dict.get(customer_name)
-
-                            if not manager_id:
-                                errors.append(f"Row {idx}: Manager '{manager_name}' not found")
-                                continue
-                            if not customer_id:
-                                errors.append(f"Row {idx}: Customer '{customer_name}' not found")
-                                continue
-
-                            # Check if project exists
-                            existing = db.execute("SELECT id FROM projects WHERE project_number = %s", project_number)
-                            if existing:
-                                # Update existing
-                                db.execute("""
-                                    UPDATE projects 
-                                    SET project_name = %s, manager_id = %s, customer_id = %s, quantity = %s
-                                    WHERE project_number = %s
-                                """, project_name, manager_id, customer_id, int(quantity), project_number)
-                            else:
-                                # Insert new
-                                db.execute("""
-                                    INSERT INTO projects (project_number, project_name, manager_id, customer_id, quantity)
-                                    VALUES (%s, %s, %s, %s, %s)
-                                """, project_number, project_name, manager_id, customer_id, int(quantity))
-
-                            rows_processed += 1
-                        except Exception as e:
-                            errors.append(f"Row {idx}: {str(e)}")
+                # Save the upload where the worker can read it, then hand it off
+                temp_dir = os.path.join(UPLOADS_DIR, "temp")
+                os.makedirs(temp_dir, exist_ok=True)
+                temp_path = os.path.join(temp_dir, f"{uuid.uuid4().hex}_{secure_filename(file.filename)}")
+                file.save(temp_path)
+                payload["path"] = temp_path
 
-                    # Clean up temp file
+                try:
+                    job_id = enqueue(db, kind, payload, session.get("user_id"))
+                except Exception as e:
                     os.remove(temp_path)
+                    flash(f"Error queueing Excel import: {str(e)}", "error")
+                    return redirect("/df/admin?tab=projects")
 
-                    if errors:
-                        flash(f"Processed {rows_processed} rows. Errors: {'; '.join(errors[:5])}", "error")
-                    else:
-                        flash(f"Successfully processed {rows_processed} projects from Excel!", "success")
-
-                except Exception as e:
-                    flash(f"Error processing Excel file: {str(e)}", "error")
+                flash(f"Excel import queued as job {job_id}.", "success")
+                return redirect(f"/df/admin?tab=projects&job={job_id}")
 
+            # the NOTIFY reaches the other workers; this one must not serve the old list on the redirect
+            ref_cache.invalidate()
             return redirect("/df/admin?tab=projects")
 
         # ========== PROBLEMS TAB ACTIONS ==========
         elif tab == "problems":
             if action == "delete_problem":
                 pid = request.form.get("problem_id")
-                db.execute("DELETE FROM problems WHERE id = %s", pid)
+                with db.transaction() as tx:
+                    photos = tx.execute("""
+                        DELETE FROM problem_photos WHERE problem_id = %s
+                        RETURNING file_path, thumb_path, web_path
+                    """, pid)
+                    tx.execute("DELETE FROM problems WHERE id = %s", pid)
+                    release_photo_files(tx, photos)
                 flash(f"Problem {pid} deleted.", "success")
 
             elif action == "update_date":
@@ -670,23 +1285,34 @@ def admin():
                     "UPDATE problems SET planned_closing_date = %s WHERE id = %s",
                     new_date, pid
                 )
+                queue_reports([pid])
                 flash(f"Updated closing date for Problem {pid}.", "success")
 
             elif action == "update_step_status":
                 step_id = request.form.get("step_id")
                 new_status = request.form.get("status")
                 if step_id and new_status:
-                    db.execute("UPDATE problem_steps SET status = %s WHERE id = %s", new_status, step_id)
+                    rows = db.execute("UPDATE problem_steps SET status = %s WHERE id = %s RETURNING problem_id",
+                                      new_status, step_id)
+                    queue_reports([row["problem_id"] for row in rows])
                     flash("Step status updated successfully!", "success")
 
             elif action == "delete_component":
                 cid = request.form.get("component_id")
-                db.execute("DELETE FROM problem_components WHERE id = %s", cid)
+                with db.transaction() as tx:
+                    photos = tx.execute("""
+                        DELETE FROM problem_photos WHERE problem_component_id = %s
+                        RETURNING file_path, thumb_path, web_path
+                    """, cid)
+                    rows = tx.execute("DELETE FROM problem_components WHERE id = %s RETURNING problem_id", cid)
+                    release_photo_files(tx, photos)
+                queue_reports([row["problem_id"] for row in rows])
                 flash(f"Component {cid} deleted.", "success")
 
             elif action == "delete_step":
                 sid = request.form.get("step_id")
-                db.execute("DELETE FROM problem_steps WHERE id = %s", sid)
+                rows = db.execute("DELETE FROM problem_steps WHERE id = %s RETURNING problem_id", sid)
+                queue_reports([row["problem_id"] for row in rows])
                 flash(f"Step {sid} deleted.", "success")
 
             return redirect("/df/admin?tab=problems")
@@ -694,102 +1320,132 @@ def admin():
     # ========== GET REQUEST - LOAD DATA ==========
     active_tab = request.args.get("tab", "problems")
 
-    # Load projects data with groups and components (for Tab 1)
-    projects_raw = db.execute("""
-        SELECT p.id, p.project_number, p.project_name, p.quantity,
-               m.id as manager_id, m.manager_name, 
-               c.id as customer_id, c.customer_name, c.customer_country,
-               COUNT(DISTINCT pr.id) as problem_count
-        FROM projects p
-        JOIN managers m ON p.manager_id = m.id
-        JOIN customers c ON p.customer_id = c.id
-        LEFT JOIN problems pr ON pr.project_id = p.id
-        GROUP BY p.id
-        ORDER BY p.project_number
-    """)
-    
-    # Build hierarchical structure: projects -> groups -> components
-    projects = []
-    for proj in projects_raw:
-        # Get groups for this project
-        groups_raw = db.execute("""
-            SELECT g.id, g.group_number, g.group_name, e.engineer_name, e.id as engineer_id
-            FROM groups g
-            JOIN engineers e ON g.engineer_id = e.id
-            WHERE g.project_id = %s
-            ORDER BY g.group_number
-        """, proj["id"])
-        
-        groups = []
-        for grp in groups_raw:
-            # Get components for this group
-            components = db.execute("""
-                SELECT id, position_no, component_no, component_name, unit_quantity, 
-                       total_quantity, weight, description, size, materials, 
-                       machine_type, notes, working_area
-                FROM components
-                WHERE group_id = %s
-                ORDER BY component_no
-            """, grp["id"])
-            
-            groups.append({
-                **grp,
-                "components": components
-            })
-        
-        projects.append({
-            **proj,
-            "groups": groups
-        })
-
-    managers = db.execute("SELECT id, manager_name FROM managers ORDER BY manager_name")
-    customers = db.execute("SELECT id, customer_name, customer_country FROM customers ORDER BY customer_name")
-
-    # Load problems data (for Tab 2)
-    problems = db.execute("""
-        SELECT p.id, p.created_at, p.planned_closing_date,
-               pr.project_number, pr.project_name,
-               g.group_name,
-               u.username
-        FROM problems p
-        JOIN projects pr ON p.project_id = pr.id
-        JOIN groups g ON p.group_id = g.id
-        JOIN users u ON p.user_id = u.id
-        ORDER BY p.created_at DESC
-    """)
-
-    reports = []
-    for prob in problems:
-        components = db.execute("""
-            SELECT pc.id, c.component_name, pc.reason, pc.priority,
-                   pc.department, pc.action
-            FROM problem_components pc
-            JOIN components c ON pc.component_id = c.id
-            WHERE pc.problem_id = %s
-        """, prob["id"])
-
-        steps = db.execute("""
-            SELECT id, step_number, df_filename, status, action, problem_id
-            FROM problem_steps
-            WHERE problem_id = %s
-            ORDER BY step_number
-        """, prob["id"])
-
-        reports.append({
-            **prob,
-            "components": components,
-            "steps": steps
-        })
+    # Load projects data with groups and components (for Tab 1); the tree is
+    # cached, only the problem counts are queried per request
+    problem_counts = {
+        row["project_id"]: row["problem_count"]
+        for row in db.execute("SELECT project_id, COUNT(*) AS problem_count FROM problems GROUP BY project_id")
+    }
+    projects = [
+        {**proj, "problem_count": problem_counts.get(proj["id"], 0)}
+        for proj in ref_cache.get("project_tree", build_project_tree)
+    ]
+
+    managers = ref_cache.get("managers")
+    customers = ref_cache.get("customers")
+    users = ref_cache.get("users")
+
+    # Load the first page of problems (for Tab 2); further pages come from /df/admin/problems
+    try:
+        problem_filters = parse_problem_filters(request.args)
+    except ValueError as e:
+        flash(f"Invalid filter: {e}", "error")
+        problem_filters = parse_problem_filters({})
+    reports, next_cursor = fetch_problems_page(problem_filters)
+    status_counts = {
+        row["current_status"]: row["count"]
+        for row in db.execute("SELECT current_status, COUNT(*) AS count FROM problems GROUP BY current_status")
+    }
 
-    t = get_translations()
     return render_template("admin.html", 
                          reports=reports, 
+                         next_cursor=next_cursor,
+                         problem_filters=problem_filters,
+                         problem_query=urlencode({k: v for k, v in problem_filters.items() if v}),
                          projects=projects, 
                          managers=managers, 
                          customers=customers,
+                         users=users,
                          status_options=status,
+                         status_counts=status_counts,
+                         open_count=sum(count for key, count in status_counts.items() if key not in CLOSED_STATUSES),
+                         closed_count=sum(status_counts.get(key, 0) for key in CLOSED_STATUSES),
                          active_tab=active_tab,
-                         t=t)
+                         job_id=request.args.get("job", type=int))
+
+
+@app.route("/df/admin/problems", methods=["GET"])
+@admin_required
+def admin_problems_page():
+    """Next page of the admin problems table, as rendered rows plus a cursor"""
+    try:
+        filters = parse_problem_filters(request.args)
+        reports, next_cursor = fetch_problems_page(filters, cursor=request.args.get("cursor"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    html = render_template("partials/admin_problem_rows.html", reports=reports, status_options=status)
+    return jsonify({"html": html, "next_cursor": next_cursor, "count": len(reports)})
+
+
+@app.route("/df/admin/jobs/<int:job_id>", methods=["GET"])
+@admin_required
+def admin_job(job_id):
+    """Status of a background job, polled by the admin UI"""
+    job = get_job(db, job_id)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(job_status(job))
+
+
+@app.route("/df/admin/cache", methods=["GET"])
+@admin_required
+def admin_cache():
+    """Reference-data cache hit/miss counters for this worker process"""
+    return jsonify({**ref_cache.stats(), "component_suggestions": component_suggestions.stats()})
+
+
+def prometheus_labels(**labels):
+    """{name="value",...} with Prometheus label escaping"""
+    pairs = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+@app.route("/df/admin/metrics", methods=["GET"])
+@admin_required
+def admin_metrics():
+    """Cumulative query statistics of this worker process, in Prometheus text format"""
+    lines = []
+    metrics = (
+        ("unimak_db_queries_total", "counter", "Statements executed", 2),
+        ("unimak_db_query_seconds_total", "counter", "Time spent executing statements", 3),
+        ("unimak_db_query_rows_total", "counter", "Rows returned or affected", 4),
+        ("unimak_db_query_seconds_max", "gauge", "Slowest single execution", 5),
+    )
+    statements = db.stats.snapshot()
+    for name, kind, help_text, column in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for row in statements:
+            lines.append(f"{name}{prometheus_labels(route=row[0], statement=row[1])} {row[column]}")
+
+    pool = db.pool_stats()
+    for key in ("size", "in_use", "idle", "checkouts", "timeouts", "wait_time_total"):
+        lines.append(f"# TYPE unimak_db_pool_{key} {'counter' if key in ('checkouts', 'timeouts', 'wait_time_total') else 'gauge'}")
+        lines.append(f"unimak_db_pool_{key} {pool[key]}")
+
+    replicas = db.replica_stats()
+    for name, kind, key in (("up", "gauge", "up"), ("reads_total", "counter", "reads"),
+                            ("failures_total", "counter", "failures")):
+        if replicas:
+            lines.append(f"# TYPE unimak_db_replica_{name} {kind}")
+        for replica in replicas:
+            lines.append(f"unimak_db_replica_{name}{prometheus_labels(replica=replica['replica'])} {int(replica[key])}")
+
+    prepared = db.prepared_stats()
+    for key in ("prepared", "executed", "deallocated", "failed"):
+        lines.append(f"# TYPE unimak_db_prepared_{key}_total counter")
+        lines.append(f"unimak_db_prepared_{key}_total {prepared[key]}")
+
+    cache = ref_cache.stats()
+    for key in ("hits", "misses", "invalidations"):
+        lines.append(f"# TYPE unimak_ref_cache_{key}_total counter")
+        lines.append(f"unimak_ref_cache_{key}_total {cache[key]}")
+
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
 
 
 # Redirect old admin/projects route to main admin with projects tab
@@ -800,6 +1456,115 @@ def admin_projects_redirect():
 
 
 
+# -------------------- CLI --------------------
+@app.cli.command("backfill-photos")
+def backfill_photos():
+    """Index photos already on disk under UPLOADS_DIR/df_* into problem_photos."""
+    # df folder name -> problem id, via the df_filename recorded on the steps
+    problem_by_df = {
+        row["df_filename"].split(".")[0]: row["problem_id"]
+        for row in db.execute("SELECT DISTINCT df_filename, problem_id FROM problem_steps")
+    }
+    problem_by_pc = {
+        row["id"]: row["problem_id"]
+        for row in db.execute("SELECT id, problem_id FROM problem_components")
+    }
+
+    added = skipped = existing = 0
+    for df_folder in sorted(os.listdir(UPLOADS_DIR)):
+        df_dir = os.path.join(UPLOADS_DIR, df_folder)
+        if not df_folder.startswith("df_") or not os.path.isdir(df_dir):
+            continue
+
+        # (problem_component_id or None, pictures dir) pairs for both folder layouts
+        picture_dirs = [(None, "pictures")]
+        for entry in os.listdir(df_dir):
+            m = re.fullmatch(r"component_(\d+)", entry)
+            if m:
+                picture_dirs.append((int(m.group(1)), os.path.join(entry, "pictures")))
+
+        for pc_id, rel_dir in picture_dirs:
+            abs_dir = os.path.join(df_dir, rel_dir)
+            if not os.path.isdir(abs_dir):
+                continue
+            problem_id = problem_by_pc.get(pc_id) if pc_id else problem_by_df.get(df_folder)
+            for name in sorted(os.listdir(abs_dir)):
+                if not os.path.isfile(os.path.join(abs_dir, name)):
+                    continue
+                if problem_id is None:
+                    skipped += 1
+                    continue
+                inserted = db.execute("""
+                    INSERT INTO problem_photos (problem_id, problem_component_id, file_path)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT (file_path) DO NOTHING
+                    RETURNING id
+                """, problem_id, pc_id, f"{df_folder}/{rel_dir}/{name}")
+                if inserted:
+                    added += 1
+                else:
+                    existing += 1
+
+    print(f"Indexed {added} photos ({existing} already indexed, {skipped} skipped: no matching problem)")
+
+
+@app.cli.command("import-bom")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--group-id", type=int, required=True, help="Group the components belong to.")
+@click.option("--first-row", type=int, default=BOM_FIRST_ROW, show_default=True, help="First data row of the sheet.")
+def import_bom(path, group_id, first_row):
+    """Load a BOM workbook (columns A:L) into the components of one group."""
+    result = import_components(db, path, group_id, first_row=first_row)
+    for error in result["errors"]:
+        print(error)
+    print(f"Imported {result['rows_processed']} components in {result['elapsed']:.1f}s "
+          f"({result['rows_per_sec']:.0f} rows/s), {len(result['errors'])} errors "
+          f"({result['duplicates']} duplicate rows)")
+
+
+@app.cli.command("generate-thumbnails")
+def generate_thumbnails():
+    """Render thumbnail and web variants for every photo that has none yet."""
+    done, failed = generate_variants(db, storage)
+    print(f"Rendered variants for {done} photos, {failed} failed")
+
+
+@app.cli.command("dedupe-uploads")
+def dedupe_uploads():
+    """Move files under UPLOADS_DIR/df_* into content-addressed blob storage."""
+    moved, freed = storage.import_legacy(db)
+    print(f"Moved {moved} files into blob storage, {freed / 1024 / 1024:.1f} MB of duplicates freed")
+
+
+@app.cli.command("cleanup-sessions")
+def cleanup_sessions():
+    """Delete expired rows from the sessions table."""
+    removed = 0
+    while True:
+        count = cleanup_expired(db)
+        removed += count
+        if not count:
+            break
+    print(f"Removed {removed} expired sessions")
+
+
+@app.cli.command("gc-uploads")
+def gc_uploads():
+    """Delete blobs no logical upload path refers to any more."""
+    print(f"Removed {storage.gc(db)} unreferenced blobs")
+
+
+@app.cli.command("render-reports")
+@click.option("--chunk-size", default=200, show_default=True, help="Problems per df_report job.")
+def render_reports(chunk_size):
+    """Queue DF report jobs for every problem; run several worker.py processes to render in parallel."""
+    problem_ids = [row["id"] for row in db.execute("SELECT id FROM problems ORDER BY id")]
+    for start in range(0, len(problem_ids), chunk_size):
+        enqueue(db, "df_report", {"problem_ids": problem_ids[start:start + chunk_size], "uploads_dir": UPLOADS_DIR,
+                                  "reports_dir": REPORTS_DIR})
+    print(f"Queued {len(problem_ids)} problems in {-(-len(problem_ids) // chunk_size)} jobs")
+
+
 # -------------------- RUN APP --------------------
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
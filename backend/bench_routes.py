@@ -0,0 +1,184 @@
+"""
+Route-level benchmark against a local PostgreSQL (fill it with seed.py first).
+
+    python bench_routes.py --user seed250101120000_admin --password seed
+    python bench_routes.py ... --save baseline.json
+    python bench_routes.py ... --baseline baseline.json   # exit 1 on regressions
+    python bench_routes.py ... --prepare-threshold 0 --save plain.json
+
+Drives index, upload (form and POST), info, history, admin and the
+component typeahead through Flask's test client, logged in as the given
+user. It reports latency percentiles, statements per request (from the
+Server-Timing header set by the query instrumentation) and peak Python
+memory per route. Memory is measured in a separate tracemalloc pass so it
+does not skew the timings.
+
+--prepare-threshold overrides DB_PREPARE_THRESHOLD (0 runs every statement
+as plain SQL), so comparing a run with 0 against the default shows what
+server-side prepared statements save on each route.
+"""
+import argparse
+import io
+import json
+import os
+import re
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from urllib.parse import quote
+
+from dotenv import load_dotenv
+
+
+QUERIES_RE = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+def percentile(samples, pct):
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def make_routes(db):
+    """[(name, method, path, form-builder or None)]"""
+    group = db.execute("""
+        SELECT g.id, g.project_id, MIN(c.id) AS component_id, MIN(c.component_no) AS component_no
+        FROM groups g
+        JOIN components c ON c.group_id = g.id
+        GROUP BY g.id
+        ORDER BY g.id DESC
+        LIMIT 1
+    """)
+    routes = [
+        ("index", "GET", "/df/", None),
+        ("upload", "GET", "/df/upload", None),
+        ("info", "GET", "/df/info", None),
+        ("history", "GET", "/df/history", None),
+        ("admin", "GET", "/df/admin", None),
+    ]
+    if group:
+        group = group[0]
+
+        def upload_form():
+            return {
+                "project_id": str(group["project_id"]),
+                "group_id": str(group["id"]),
+                "planned_closing_date": (date.today() + timedelta(days=14)).isoformat(),
+                "components[0][component_id]": str(group["component_id"]),
+                "components[0][reason]": "reasons.wrong_part",
+                "components[0][priority]": "priority.low",
+                "components[0][description]": "bench_routes.py",
+                "components[0][photos]": (io.BytesIO(b"\xff\xd8 bench photo"), "bench.jpg"),
+            }
+
+        routes.append(("upload POST", "POST", "/df/upload", upload_form))
+        # a typical typeahead prefix; after the first request it is served from the LRU
+        prefix = quote(group["component_no"][:4])
+        routes.append(("suggest", "GET", f"/df/groups/{group['id']}/components/suggest?q={prefix}", None))
+    return routes
+
+
+def run_route(client, method, path, form, requests):
+    samples, queries, errors = [], [], 0
+    for _ in range(requests):
+        started = time.perf_counter()
+        if method == "GET":
+            response = client.get(path)
+        else:
+            response = client.post(path, data=form(), content_type="multipart/form-data")
+        samples.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            errors += 1
+        match = QUERIES_RE.search(response.headers.get("Server-Timing", ""))
+        if match:
+            queries.append(int(match.group(1)))
+    samples.sort()
+    return {
+        "mean_ms": statistics.mean(samples),
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+        "queries": statistics.mean(queries) if queries else None,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--user", required=True)
+    parser.add_argument("--password", default="seed")
+    parser.add_argument("--requests", type=int, default=50, help="timed requests per route")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--routes", help="comma-separated subset, e.g. index,admin")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with a JSON file written by --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown, as a fraction")
+    parser.add_argument("--prepare-threshold", type=int, help="overrides DB_PREPARE_THRESHOLD")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.prepare_threshold is not None:
+        os.environ["DB_PREPARE_THRESHOLD"] = str(args.prepare_threshold)
+    import app as app_module
+
+    app = app_module.app
+    client = app.test_client()
+    response = client.post("/df/login", data={"username": args.user, "password": args.password})
+    if response.status_code != 302:
+        sys.exit(f"Could not log in as {args.user!r} (status {response.status_code})")
+
+    routes = make_routes(app_module.db)
+    app_module.db.release()
+    if args.routes:
+        wanted = set(args.routes.split(","))
+        routes = [route for route in routes if route[0].split()[0] in wanted]
+
+    results = {}
+    for name, method, path, form in routes:
+        for _ in range(args.warmup):
+            run_route(client, method, path, form, 1)
+        results[name] = run_route(client, method, path, form, args.requests)
+
+        tracemalloc.start()
+        run_route(client, method, path, form, 1)
+        results[name]["peak_kib"] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+
+    print(f"\n{'route':<14}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}{'peak KiB':>11}{'errors':>8}")
+    for name, r in results.items():
+        queries = f"{r['queries']:.1f}" if r["queries"] is not None else "-"
+        print(f"{name:<14}{r['mean_ms']:>10.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+              f"{r['p99_ms']:>10.1f}{queries:>10}{r['peak_kib']:>11.0f}{r['errors']:>8}")
+    prepared = app_module.db.prepared_stats()
+    print(f"\nprepared statements: threshold {prepared['threshold']}, {prepared['prepared']} prepared, "
+          f"{prepared['executed']} executions, {prepared['failed']} not preparable")
+    # ru_maxrss is KiB on Linux
+    print(f"process max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = []
+        for name, r in results.items():
+            before = baseline.get(name)
+            if not before:
+                continue
+            if r["p95_ms"] > before["p95_ms"] * (1 + args.tolerance):
+                regressions.append(f"{name}: p95 {before['p95_ms']:.1f} -> {r['p95_ms']:.1f} ms")
+            if r["queries"] is not None and before.get("queries") is not None and r["queries"] > before["queries"]:
+                regressions.append(f"{name}: queries {before['queries']:.1f} -> {r['queries']:.1f}")
+            if r["errors"] > before.get("errors", 0):
+                regressions.append(f"{name}: {r['errors']} failed requests")
+        if regressions:
+            print("\nRegressions against " + args.baseline + ":\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Compare per-request session overhead across the SESSION_BACKEND choices.
+
+Each backend gets a tiny Flask app with a "read" route (session.get, the
+common case) and a "write" route (session changed every request), driven
+through the test client with a logged-in cookie. The reported overhead is
+the time per request above an app that never touches a session store.
+
+    python bench_sessions.py [--requests 2000]
+
+The postgres backend uses the same DATABASE_URL / DB_* settings as the app
+and is skipped when the database (or its sessions table) is unreachable. A
+backend whose routes answer with an error fails the run (exit 1) instead of
+being timed.
+"""
+import argparse
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from dotenv import load_dotenv
+from flask import Flask, session
+from flask.sessions import SessionInterface
+
+from db import Database
+from sessions import SESSION_BACKENDS, init_sessions
+
+
+class BadResponse(Exception):
+    """A benchmarked route did not answer 2xx."""
+
+
+class NoSessionInterface(SessionInterface):
+    """Baseline: every request gets Flask's null session and nothing is stored."""
+
+    def open_session(self, app, request):
+        return None
+
+    def save_session(self, app, session, response):
+        pass
+
+
+def make_app(backend, db):
+    app = Flask(__name__)
+    app.config["SECRET_KEY"] = "bench"
+    app.config["SESSION_PERMANENT"] = False
+    if backend == "baseline":
+        app.session_interface = NoSessionInterface()
+    else:
+        if backend == "filesystem":
+            app.config["SESSION_FILE_DIR"] = tempfile.mkdtemp(prefix="bench_sessions_")
+        init_sessions(app, db, backend)
+
+    @app.route("/login")
+    def login():
+        if backend != "baseline":
+            session["user_id"] = 1
+            session["language"] = "en"
+            session["role"] = "admin"
+        return ""
+
+    @app.route("/read")
+    def read():
+        return str(session.get("user_id"))
+
+    @app.route("/write")
+    def write():
+        if backend != "baseline":
+            session["counter"] = session.get("counter", 0) + 1
+        return ""
+
+    @app.teardown_appcontext
+    def release(exception):
+        db.release()
+
+    return app
+
+
+def get(client, path):
+    response = client.get(path)
+    if not 200 <= response.status_code < 300:
+        raise BadResponse(f"GET {path} answered {response.status_code}")
+    return response
+
+
+def timed(client, path, requests):
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        get(client, path)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per backend and route")
+    args = parser.parse_args()
+
+    load_dotenv()
+    db = Database(minconn=1, maxconn=1)
+
+    results = {}
+    failed = []
+    for backend in ("baseline",) + SESSION_BACKENDS:
+        app = make_app(backend, db)
+        try:
+            with app.test_client() as client:
+                get(client, "/login")
+                for route in ("read", "write"):
+                    timed(client, "/" + route, min(100, args.requests))   # warm up
+                    results[backend, route] = timed(client, "/" + route, args.requests)
+        except BadResponse as e:
+            print(f"{backend}: FAILED ({e})")
+            failed.append(backend)
+        except Exception as e:
+            print(f"{backend}: skipped ({e.__class__.__name__}: {e})".strip())
+        finally:
+            if backend == "filesystem":
+                shutil.rmtree(app.config["SESSION_FILE_DIR"], ignore_errors=True)
+
+    print(f"\n{'backend':<12}{'route':<8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'overhead ms':>14}")
+    for (backend, route), (mean, p50, p95) in results.items():
+        baseline = results.get(("baseline", route), (mean,))[0]
+        print(f"{backend:<12}{route:<8}{mean:>10.3f}{p50:>10.3f}{p95:>10.3f}{mean - baseline:>14.3f}")
+    db.close()
+    if failed:
+        sys.exit(f"Failing backends: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Regression check: the home and admin pages must issue the same number of
+SQL statements however much data there is (no per-row follow-up queries).
+
+    python check_query_counts.py            # exit 1 if a count grows with the data
+
+Needs no database: Database.execute is replaced by a counter that answers
+every statement with `scale` synthetic rows, and each route is requested
+once with a small and once with a large scale through Flask's test client.
+Reference data is warmed up first, so only the per-request statements are
+compared. bench_routes.py --baseline checks the same against real data.
+
+Run it as its own process from backend/: app reads SESSION_BACKEND and
+DB_REPLICA_URLS when it is imported, so they are set (unless already in the
+environment) before `import app`, and the patches go on the Database class,
+which only reaches code that looks db.execute up at call time.
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+
+os.environ.setdefault("SESSION_BACKEND", "cookie")
+os.environ.setdefault("DB_REPLICA_URLS", "")
+
+ROUTES = ("/df/", "/df/?status=open", "/df/admin", "/df/admin?status=open", "/df/admin/problems")
+SCALES = (2, 500)
+
+
+class Row(dict):
+    """A result row that has every column: unknown ones are None."""
+
+    def __missing__(self, key):
+        return None
+
+
+def fake_rows(scale):
+    started = datetime(2025, 1, 1)
+    return [
+        Row(id=i, problem_id=i, project_id=i, group_id=i, component_id=i, user_id=1,
+            created_at=started - timedelta(minutes=i), current_status="Open",
+            count=1, problem_count=1, project_number=f"P{i}", manager_name=f"M{i}",
+            df_filename=f"df_{i}.xlsx", components=[])
+        for i in range(1, scale + 1)
+    ]
+
+
+def main():
+    if "app" in sys.modules:
+        sys.exit("check_query_counts.py must run as its own process: app was imported before its environment was set")
+    import app as app_module
+    from db import Database
+
+    state = {"rows": [], "statements": 0}
+
+    def execute(self, query, *args, prepare=True):
+        state["statements"] += 1
+        return state["rows"] if query.lstrip().upper().startswith(("SELECT", "WITH")) else []
+
+    Database.execute = execute
+    Database.begin_request = lambda self, read_primary=False: None
+
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess["user_id"] = 1
+        sess["role"] = "admin"
+
+    failures = []
+    print(f"{'route':<26}" + "".join(f"{f'{scale} rows':>12}" for scale in SCALES))
+    for path in ROUTES:
+        counts = []
+        for scale in SCALES:
+            state["rows"] = fake_rows(scale)
+            app_module.ref_cache.invalidate()
+            client.get(path)        # loads the reference data
+            state["statements"] = 0
+            response = client.get(path)
+            if response.status_code != 200:
+                failures.append(f"{path}: status {response.status_code} with {scale} rows")
+            counts.append(state["statements"])
+        print(f"{path:<26}" + "".join(f"{count:>12}" for count in counts))
+        if len(set(counts)) > 1:
+            failures.append(f"{path}: {' -> '.join(map(str, counts))} statements")
+
+    if failures:
+        print("\nStatement counts depend on the data:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("\nStatement counts are constant")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,355 @@
 Database wrapper for PostgreSQL compatibility with cs50.SQL-like interface
 """
 import psycopg2
+import psycopg2.errors
 import psycopg2.extras
+import psycopg2.extensions
+import psycopg2.pool
 from psycopg2.extras import RealDictCursor
+import hashlib
+import itertools
+import logging
 import os
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
 from contextlib import contextmanager
 
 
+logger = logging.getLogger(__name__)
+
+
+# %s placeholders (numbered for PREPARE) and %% escapes (a literal % on the server)
+PLACEHOLDER_RE = re.compile(r"%[s%]")
+
+# SELECTs that take locks or change state, and so must run on the primary
+WRITING_SELECT_RE = re.compile(
+    r"\bFOR\s+(?:NO\s+KEY\s+)?(?:UPDATE|SHARE)\b|\bFOR\s+KEY\s+SHARE\b|\b(?:nextval|setval|pg_advisory_\w*)\s*\(",
+    re.IGNORECASE)
+
+# target table of an INSERT (schema and quotes dropped)
+INSERT_TABLE_RE = re.compile(r'^\s*INSERT\s+INTO\s+(?:"?\w+"?\.)?"?(\w+)"?', re.IGNORECASE)
+
+# distinct SQL texts whose Statement is remembered; well above the number of
+# fixed queries in the app, the rest are built per request
+STATEMENT_CACHE_SIZE = 1000
+
+# errors after which a replica read is retried elsewhere (see Database._replica_failed)
+REPLICA_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, psycopg2.errors.SerializationFailure)
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection became free within the timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections.
+
+    Unlike psycopg2.pool.ThreadedConnectionPool, callers block (up to
+    `timeout` seconds) when all connections are in use instead of failing
+    straight away, and connections are health-checked on checkout.
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=10, timeout=30.0,
+                 health_check_interval=30.0, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("invalid pool size: min=%s max=%s" % (minconn, maxconn))
+
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = []          # list of (connection, returned_at)
+        self._in_use = set()
+        self._size = 0           # idle + in use + being opened
+        self._closed = False
+
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "discarded": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        return psycopg2.connect(self.dsn, **self._connect_kwargs)
+
+    def _is_healthy(self, conn, idle_since):
+        """Cheap checks first; only ping the server if the connection sat idle."""
+        if conn.closed:
+            return False
+        status = conn.info.transaction_status
+        if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            if not conn.closed:
+                conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        """Check out a healthy connection, waiting for one if the pool is full."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise psycopg2.pool.PoolError("connection pool is closed")
+                    if self._idle:
+                        conn, idle_since = self._idle.pop()
+                        self._in_use.add(conn)
+                        opened = False
+                        break
+                    if self._size < self.maxconn:
+                        # reserve a slot and open the connection outside the lock
+                        self._size += 1
+                        conn, idle_since, opened = None, None, True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(
+                            "no database connection available after %.1fs "
+                            "(pool size %d)" % (self.timeout, self.maxconn))
+                    self._cond.wait(remaining)
+
+            if opened:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._in_use.add(conn)
+            elif not self._is_healthy(conn, idle_since):
+                self._discard(conn)
+                with self._cond:
+                    self._in_use.discard(conn)
+                    self._size -= 1
+                    self._stats["discarded"] += 1
+                    self._cond.notify()
+                continue
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self._stats["checkouts"] += 1
+                self._stats["wait_time_total"] += waited
+                if waited > self._stats["wait_time_max"]:
+                    self._stats["wait_time_max"] = waited
+            return conn
+
+    def putconn(self, conn, close=False):
+        """Return a connection to the pool (or close it if it is broken)."""
+        if not close and not conn.closed:
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                close = True
+
+        with self._cond:
+            if conn not in self._in_use:
+                return
+            self._in_use.discard(conn)
+            if close or conn.closed or self._closed:
+                self._size -= 1
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def stats(self):
+        """Snapshot of pool usage counters."""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "size": self._size,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+            })
+        checkouts = snapshot["checkouts"]
+        snapshot["wait_time_avg"] = snapshot["wait_time_total"] / checkouts if checkouts else 0.0
+        return snapshot
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._discard(conn)
+            for conn in self._in_use:
+                self._discard(conn)
+            self._idle = []
+            self._in_use = set()
+            self._size = 0
+            self._cond.notify_all()
+
+
+class QueryStats:
+    """
+    Cumulative per-(route, statement) counters for this process, plus the
+    running totals of the request currently handled by each thread.
+    """
+
+    def __init__(self, slow_query_ms=200.0):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._statements = {}     # (route, statement) -> [count, seconds, rows, max seconds]
+        self._local = threading.local()
+
+    def start_request(self, route):
+        self._local.request = {"route": route, "queries": 0, "seconds": 0.0, "rows": 0}
+
+    def finish_request(self):
+        """Totals for the request on this thread: {"route", "queries", "seconds", "rows"}"""
+        request = getattr(self._local, "request", None)
+        self._local.request = None
+        return request
+
+    def record(self, query, seconds, rows):
+        request = getattr(self._local, "request", None)
+        route = request["route"] if request else "-"
+        statement = " ".join(query.split())
+        if request:
+            request["queries"] += 1
+            request["seconds"] += seconds
+            request["rows"] += rows
+
+        with self._lock:
+            entry = self._statements.setdefault((route, statement), [0, 0.0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += rows
+            if seconds > entry[3]:
+                entry[3] = seconds
+
+        if seconds * 1000 >= self.slow_query_ms:
+            logger.warning("Slow query (%.1f ms, %d rows) in %s: %s", seconds * 1000, rows, route, statement)
+
+    def snapshot(self):
+        """[(route, statement, count, seconds, rows, max seconds)] sorted by total time"""
+        with self._lock:
+            rows = [(route, statement, *entry) for (route, statement), entry in self._statements.items()]
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+
+class Transaction:
+    """
+    Statements issued through a Database.transaction() block. They share one
+    connection and are committed (or rolled back) together.
+    """
+
+    def __init__(self, connection, stats):
+        self._connection = connection
+        self._stats = stats
+
+    def execute(self, query, *args):
+        """Execute a statement; return its rows (SELECT, RETURNING) or []."""
+        started = time.perf_counter()
+        with self._connection.cursor() as cur:
+            cur.execute(query, args)
+            result = cur.fetchall() if cur.description is not None else []
+            self._stats.record(query, time.perf_counter() - started, max(cur.rowcount, 0))
+            return result
+
+    def execute_values(self, query, rows, page_size=1000, fetch=False):
+        """
+        Multi-row statement with a single `VALUES %s`. With fetch=True the
+        RETURNING rows of every page are returned.
+        """
+        if not rows:
+            return []
+        started = time.perf_counter()
+        with self._connection.cursor() as cur:
+            result = psycopg2.extras.execute_values(cur, query, rows, page_size=page_size, fetch=fetch)
+            self._stats.record(query, time.perf_counter() - started, len(rows))
+            return result if fetch else []
+
+
+class Statement:
+    """
+    What Database.execute needs to know about one SQL text, worked out once:
+    its kind ("select", "insert" or "other"), the table an INSERT writes,
+    whether a replica may run it, and, when it only uses positional %s
+    placeholders, the PREPARE/EXECUTE forms of it.
+    """
+
+    __slots__ = ("query", "kind", "table", "read_only", "name", "prepare_sql", "execute_sql", "params",
+                 "executions")
+
+    def __init__(self, query):
+        self.query = query
+        words = query.split(None, 1)
+        first = words[0].upper() if words else ""
+        self.kind = first.lower() if first in ("SELECT", "INSERT") else "other"
+        self.read_only = self.kind == "select" and not WRITING_SELECT_RE.search(query)
+        match = INSERT_TABLE_RE.match(query) if self.kind == "insert" else None
+        self.table = match.group(1).lower() if match else None
+        self.executions = 0
+
+        self.name = self.prepare_sql = self.execute_sql = None
+        self.params = 0
+        if "%(" in query or first in ("PREPARE", "EXECUTE", "DEALLOCATE"):
+            return
+
+        def number(match):
+            if match.group() == "%%":
+                return "%"
+            self.params += 1
+            return f"${self.params}"
+
+        self.name = "stmt_" + hashlib.sha1(query.encode()).hexdigest()[:16]
+        self.prepare_sql = f"PREPARE {self.name} AS {PLACEHOLDER_RE.sub(number, query)}"
+        self.execute_sql = f"EXECUTE {self.name}" + (f" ({', '.join(['%s'] * self.params)})" if self.params else "")
+
+
+class Replica:
+    """A read replica: its own pool, and when it may be tried again after failing."""
+
+    def __init__(self, url):
+        self.url = url
+        self.pool = None
+        self.down_until = 0.0
+        self.failures = 0
+        self.reads = 0
+
+    @property
+    def name(self):
+        """host:port/dbname, without credentials (for logs and stats)."""
+        dsn = psycopg2.extensions.parse_dsn(self.url)
+        return f"{dsn.get('host', 'localhost')}:{dsn.get('port', 5432)}/{dsn.get('dbname', '')}"
+
+
 class Database:
-    def __init__(self, database_url=None):
+    def __init__(self, database_url=None, minconn=None, maxconn=None, timeout=None, replica_urls=None):
         if database_url is None:
             database_url = os.environ.get('DATABASE_URL') or \
                 f"postgresql://{os.environ.get('DB_USER', 'postgres')}:" \
@@ -17,49 +358,424 @@ class Database:
                 f"{os.environ.get('DB_HOST', 'localhost')}:" \
                 f"{os.environ.get('DB_PORT', '5432')}/" \
                 f"{os.environ.get('DB_NAME', 'unimak')}"
-        
+
         self.database_url = database_url
-        self._connection = None
-    
+        self.minconn = int(minconn if minconn is not None else os.environ.get('DB_POOL_MIN', 1))
+        self.maxconn = int(maxconn if maxconn is not None else os.environ.get('DB_POOL_MAX', 10))
+        self.timeout = float(timeout if timeout is not None else os.environ.get('DB_POOL_TIMEOUT', 30))
+        self.stats = QueryStats(float(os.environ.get('DB_SLOW_QUERY_MS', 200)))
+        # a statement run this many times is PREPAREd on each connection it runs on
+        # (0 disables it, e.g. behind a transaction-pooling pgbouncer)
+        self.prepare_threshold = int(os.environ.get('DB_PREPARE_THRESHOLD', 5))
+        self.prepared_per_connection = int(os.environ.get('DB_PREPARED_PER_CONNECTION', 100))
+
+        self._statements = OrderedDict()                # SQL text -> Statement, LRU
+        self._statements_lock = threading.Lock()
+        self._prepared = weakref.WeakKeyDictionary()    # connection -> OrderedDict of names, LRU
+        self._prepare_stats = {"prepared": 0, "executed": 0, "deallocated": 0, "failed": 0}
+        self._serial_tables = None      # tables with a serial / identity column, loaded on first INSERT
+
+        # read-only statements of web requests go to these, round-robin (DB_REPLICA_URLS,
+        # comma-separated); a replica that cannot be reached is skipped for DB_REPLICA_RETRY seconds
+        if replica_urls is None:
+            replica_urls = [url.strip() for url in os.environ.get('DB_REPLICA_URLS', '').split(',') if url.strip()]
+        self.replicas = [Replica(url) for url in replica_urls]
+        self.replica_retry = float(os.environ.get('DB_REPLICA_RETRY', 30))
+        self._replica_turn = itertools.count()
+
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # each thread (or greenlet, under gevent) holds at most one checked-out connection
+        self._local = threading.local()
+
+    @property
+    def pool(self):
+        # created lazily so importing app.py does not need a reachable database
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ConnectionPool(
+                        self.database_url,
+                        minconn=self.minconn,
+                        maxconn=self.maxconn,
+                        timeout=self.timeout,
+                        cursor_factory=RealDictCursor
+                    )
+        return self._pool
+
     def _get_connection(self):
-        if self._connection is None or self._connection.closed:
-            self._connection = psycopg2.connect(
-                self.database_url,
-                cursor_factory=RealDictCursor
-            )
-        return self._connection
-    
-    def execute(self, query, *args):
+        conn = getattr(self._local, "connection", None)
+        if conn is None or conn.closed:
+            if conn is not None:
+                self.pool.putconn(conn, close=True)
+            conn = self.pool.getconn()
+            self._local.connection = conn
+        return conn
+
+    def release(self):
+        """Return this thread's connection(s) to the pool (call at end of request)."""
+        conn = getattr(self._local, "connection", None)
+        if conn is not None:
+            self._local.connection = None
+            self.pool.putconn(conn)
+        replica = getattr(self._local, "replica", None)
+        if replica is not None:
+            self._local.replica = None
+            replica[0].pool.putconn(replica[1])
+        self._local.use_replicas = False
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of a with-block."""
+        try:
+            yield self._get_connection()
+        finally:
+            self.release()
+
+    def pool_stats(self):
+        return self.pool.stats()
+
+    def begin_request(self, read_primary=False):
+        """
+        Let this thread's read-only statements go to a replica until
+        release(), unless `read_primary` (the client wrote moments ago and a
+        replica may not have its change yet). Processes that never call this
+        (worker.py, CLI commands) read from the primary.
+        """
+        self._local.use_replicas = bool(self.replicas) and not read_primary
+        self._local.wrote = False
+
+    def request_wrote(self):
+        """Whether this thread wrote to the primary since begin_request()."""
+        return getattr(self._local, "wrote", False)
+
+    @contextmanager
+    def primary(self):
+        """Run the block's statements on the primary, without counting its writes as the request's."""
+        use_replicas = getattr(self._local, "use_replicas", False)
+        wrote = getattr(self._local, "wrote", False)
+        self._local.use_replicas = False
+        try:
+            yield
+        finally:
+            self._local.use_replicas = use_replicas
+            self._local.wrote = wrote
+
+    def _replica_connection(self, statement):
+        """(replica, connection) to run `statement` on, or None for the primary."""
+        if (not statement.read_only or not getattr(self._local, "use_replicas", False)
+                or getattr(self._local, "wrote", False)):
+            return None
+        # one replica per request, so its reads see one consistent state
+        current = getattr(self._local, "replica", None)
+        if current is not None and not current[1].closed:
+            return current
+
+        now = time.monotonic()
+        start = next(self._replica_turn)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            if replica.down_until > now:
+                continue
+            try:
+                if replica.pool is None:
+                    with self._pool_lock:
+                        if replica.pool is None:
+                            replica.pool = ConnectionPool(
+                                replica.url,
+                                minconn=0,
+                                maxconn=self.maxconn,
+                                timeout=min(self.timeout, 5.0),
+                                connect_timeout=3,
+                                cursor_factory=RealDictCursor
+                            )
+                conn = replica.pool.getconn()
+            except (psycopg2.Error, PoolTimeout) as e:
+                self._eject(replica, e)
+                continue
+            self._local.replica = (replica, conn)
+            return self._local.replica
+        return None
+
+    def _eject(self, replica, error, conn=None):
+        replica.failures += 1
+        replica.down_until = time.monotonic() + self.replica_retry
+        logger.warning("Replica %s ejected for %.0fs: %s", replica.name, self.replica_retry, error)
+        if conn is not None:
+            self._local.replica = None
+            replica.pool.putconn(conn, close=True)
+
+    def _replica_failed(self, statement, replica, conn, error):
+        """Where to retry a read that failed on `replica`: another replica, or None for the primary."""
+        if conn.closed:
+            # server gone: try the next replica that is still up
+            self._eject(replica, error, conn)
+            return self._replica_connection(statement)
+        # e.g. cancelled by a conflict with recovery: answer it from the primary
+        logger.warning("Replica %s failed a read, retrying on the primary: %s", replica.name, error)
+        return None
+
+    def replica_stats(self):
+        now = time.monotonic()
+        return [{
+            "replica": replica.name,
+            "up": replica.down_until <= now,
+            "reads": replica.reads,
+            "failures": replica.failures,
+            "pool": replica.pool.stats() if replica.pool is not None else None,
+        } for replica in self.replicas]
+
+    def _statement(self, query):
+        """The (cached) Statement for a SQL text."""
+        with self._statements_lock:
+            statement = self._statements.get(query)
+            if statement is not None:
+                self._statements.move_to_end(query)
+                return statement
+        statement = Statement(query)
+        with self._statements_lock:
+            self._statements[query] = statement
+            if len(self._statements) > STATEMENT_CACHE_SIZE:
+                self._statements.popitem(last=False)
+        return statement
+
+    def _prepare(self, conn, cur, statement, args):
+        """
+        Name of `statement` prepared on `conn`, PREPAREing it once it is hot
+        enough; None to run the plain SQL instead.
+        """
+        if self.prepare_threshold <= 0 or statement.name is None or len(args) != statement.params:
+            return None
+        statement.executions += 1
+        with self._statements_lock:
+            prepared = self._prepared.setdefault(conn, OrderedDict())
+        if statement.name in prepared:
+            prepared.move_to_end(statement.name)
+            return statement.name
+        # PREPARE is only attempted outside a transaction, so a failure cannot abort one
+        if (statement.executions < self.prepare_threshold or
+                conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE):
+            return None
+
+        try:
+            cur.execute(statement.prepare_sql)
+        except psycopg2.Error as e:
+            conn.rollback()
+            # e.g. `IN %s` with a tuple, which only works as client-side interpolation
+            logger.info("Not preparing %s: %s", " ".join(statement.query.split()), e)
+            statement.name = None
+            self._count("failed")
+            return None
+        prepared[statement.name] = True
+        self._count("prepared")
+
+        if len(prepared) > self.prepared_per_connection:
+            evicted, _ = prepared.popitem(last=False)
+            cur.execute(f"DEALLOCATE {evicted}")
+            self._count("deallocated")
+        return statement.name
+
+    def _count(self, key):
+        with self._statements_lock:
+            self._prepare_stats[key] += 1
+
+    def prepared_stats(self):
+        """Prepared-statement counters, plus how many statements each open connection holds."""
+        with self._statements_lock:
+            snapshot = dict(self._prepare_stats)
+            snapshot.update({
+                "threshold": self.prepare_threshold,
+                "per_connection": self.prepared_per_connection,
+                "statements_seen": len(self._statements),
+                "connections": [len(names) for names in self._prepared.values()],
+            })
+        return snapshot
+
+    def execute(self, query, *args, prepare=True):
         """
         Execute a query and return results as list of dicts.
         Compatible with cs50.SQL interface.
+
+        prepare=False keeps the statement out of server-side preparation,
+        for queries whose plan depends on the parameter values (a generic
+        plan cannot use an index for `LIKE $1`).
         """
-        conn = self._get_connection()
+        statement = self._statement(query)
+        started = time.perf_counter()
+        target = self._replica_connection(statement)
+        while target is not None:
+            replica, conn = target
+            try:
+                result, rowcount = self._run(conn, statement, args, prepare)
+                replica.reads += 1
+                break
+            except REPLICA_ERRORS as e:
+                target = self._replica_failed(statement, replica, conn, e)
+        if target is None:
+            result, rowcount = self._run(self._get_connection(), statement, args, prepare)
+            if not statement.read_only:
+                self._local.wrote = True
+        self.stats.record(query, time.perf_counter() - started, max(rowcount, 0))
+        return result
+
+    def _run(self, conn, statement, args, prepare=True):
+        """Run `statement` on `conn` and commit; returns (rows, rowcount)."""
+        query = statement.query
         with conn.cursor() as cur:
             try:
-                cur.execute(query, args)
+                name = self._prepare(conn, cur, statement, args) if prepare else None
+                if name is None:
+                    cur.execute(query, args)
+                else:
+                    try:
+                        cur.execute(statement.execute_sql, args)
+                        self._count("executed")
+                    except (psycopg2.errors.InvalidSqlStatementName, psycopg2.errors.FeatureNotSupported):
+                        # the server lost it (DISCARD ALL) or a table changed under the plan
+                        # ("cached plan must not change result type"): start over on this connection
+                        conn.rollback()
+                        cur.execute("DEALLOCATE ALL")
+                        with self._statements_lock:
+                            self._prepared.pop(conn, None)
+                        cur.execute(query, args)
                 conn.commit()
-                
+                rowcount = cur.rowcount
+
                 # For SELECT queries, return results
-                if query.strip().upper().startswith('SELECT'):
-                    return cur.fetchall()
-                # For INSERT, return last inserted ID
-                elif query.strip().upper().startswith('INSERT'):
-                    cur.execute("SELECT lastval() AS id")
-                    result = cur.fetchone()
-                    return [{'id': result['id']}]
-                # For other queries, return empty list
+                if statement.kind == "select":
+                    result = cur.fetchall()
+                # For INSERT, return last inserted ID (or the RETURNING rows)
+                elif statement.kind == "insert":
+                    if cur.description is not None:
+                        result = cur.fetchall()
+                    else:
+                        result = self._last_insert_id(conn, cur, statement)
+                # For other queries, return rows if any (WITH ..., UPDATE ... RETURNING)
+                elif cur.description is not None:
+                    result = cur.fetchall()
                 else:
-                    return []
+                    result = []
+            except Exception as e:
+                if not conn.closed:
+                    conn.rollback()
+                raise e
+        return result, rowcount
+
+    def _last_insert_id(self, conn, cur, statement):
+        """
+        [{'id': lastval()}] after an INSERT into a table with a serial or
+        identity column, else []. Other tables (e.g. sessions, keyed by text)
+        leave lastval() undefined, or set by an earlier, unrelated INSERT.
+        """
+        if self._serial_tables is None:
+            cur.execute("""
+                SELECT DISTINCT table_name FROM information_schema.columns
+                WHERE table_schema = current_schema()
+                  AND (column_default LIKE 'nextval(%' OR is_identity = 'YES')
+            """)
+            self._serial_tables = {row["table_name"] for row in cur.fetchall()}
+        result = []
+        if statement.table in self._serial_tables:
+            try:
+                cur.execute("SELECT lastval() AS id")
+                result = [{'id': cur.fetchone()['id']}]
+            except psycopg2.errors.ObjectNotInPrerequisiteState:
+                # an explicit id in the INSERT draws no value from the sequence
+                pass
+        # the INSERT is committed already; this only ends the read-only transaction opened here
+        conn.rollback()
+        return result
+
+    def iterate(self, query, *args, itersize=2000):
+        """
+        Yield the rows of a SELECT from a server-side (named) cursor,
+        fetching `itersize` rows per round-trip, so memory stays flat
+        however many rows match. Consume it fully or close() it.
+
+        A replica that fails before the first row is handled like in
+        execute(); once rows were yielded the error is raised, as starting
+        over would repeat them.
+        """
+        statement = self._statement(query)
+        target = self._replica_connection(statement)
+        started = time.perf_counter()
+        count = 0
+        try:
+            while True:
+                replica, conn = target if target is not None else (None, self._get_connection())
+                try:
+                    with conn.cursor(name=f"iterate_{id(conn)}_{threading.get_ident()}") as cur:
+                        cur.itersize = itersize
+                        cur.execute(query, args)
+                        for row in cur:
+                            count += 1
+                            yield row
+                    conn.commit()
+                    if replica is not None:
+                        replica.reads += 1
+                    return
+                except REPLICA_ERRORS as e:
+                    if not conn.closed:
+                        conn.rollback()
+                    if replica is None:
+                        raise
+                    if count:
+                        if conn.closed:
+                            self._eject(replica, e, conn)
+                        raise
+                    target = self._replica_failed(statement, replica, conn, e)
+                except BaseException:
+                    if not conn.closed:
+                        conn.rollback()
+                    raise
+        finally:
+            self.stats.record(query, time.perf_counter() - started, count)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group several statements into one transaction:
+
+            with db.transaction() as tx:
+                rows = tx.execute("INSERT ... RETURNING id", ...)
+                tx.execute_values("INSERT ... VALUES %s", [...])
+        """
+        conn = self._get_connection()
+        self._local.wrote = True
+        try:
+            yield Transaction(conn, self.stats)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def execute_values(self, query, rows, page_size=1000):
+        """
+        Execute a multi-row statement whose query contains a single
+        `VALUES %s`, sending `page_size` rows per round-trip and
+        committing once at the end.
+        """
+        conn = self._get_connection()
+        self._local.wrote = True
+        started = time.perf_counter()
+        with conn.cursor() as cur:
+            try:
+                psycopg2.extras.execute_values(cur, query, rows, page_size=page_size)
+                conn.commit()
             except Exception as e:
                 conn.rollback()
                 raise e
-    
+        self.stats.record(query, time.perf_counter() - started, len(rows))
+
     def close(self):
-        if self._connection and not self._connection.closed:
-            self._connection.close()
-            self._connection = None
-    
+        self._local = threading.local()
+        if self._pool is not None:
+            self._pool.closeall()
+            self._pool = None
+        for replica in self.replicas:
+            if replica.pool is not None:
+                replica.pool.closeall()
+                replica.pool = None
+
     def __del__(self):
         self.close()
-
@@ -1,5 +1,8 @@
+import base64
+import json
 import requests
 
+from datetime import datetime
 from flask import redirect, render_template, session
 from functools import wraps
 
@@ -60,6 +63,22 @@ def admin_required(f):
     return decorated_function
 
 
+def encode_cursor(created_at, row_id):
+    """Encode a (created_at, id) keyset position as an opaque URL-safe token."""
+    raw = json.dumps([created_at.isoformat(), row_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor. Raises ValueError on a malformed token."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+
+
 def lookup(symbol):
     """Look up quote for symbol."""
     url = f"https://finance.cs50.io/quote?symbol={symbol.upper()}"
@@ -77,47 +96,3 @@ def lookup(symbol):
     except (KeyError, ValueError) as e:
         print(f"Data parsing error: {e}")
     return None
-
-
-# Translation dictionary
-translations = {
-    "en": {
-        "upload": "Upload",
-        "history": "History",
-        "settings": "Settings",
-        "project_number": "Project Number",
-        "project_manager": "Project Manager",
-        "reason": "Reason",
-        "description": "Description",
-        "save": "Save",
-        "choose_language": "Choose Language",
-    },
-    "tr": {
-        "upload": "Yükle",
-        "history": "Geçmiş",
-        "settings": "Ayarlar",
-        "project_number": "Proje Numarası",
-        "project_manager": "Proje Yöneticisi",
-        "reason": "Sebep",
-        "description": "Açıklama",
-        "save": "Kaydet",
-        "choose_language": "Dil Seçiniz",
-    },
-    "es": {
-        "upload": "Subir",
-        "history": "Historial",
-        "settings": "Configuración",
-        "project_number": "Número de Proyecto",
-        "project_manager": "Gerente del Proyecto",
-        "reason": "Razón",
-        "description": "Descripción",
-        "save": "Guardar",
-        "choose_language": "Seleccionar Idioma",
-    }
-}
-
-def get_translations():
-    lang = session.get("language", "en")  # default English
-    return translations.get(lang, translations["en"])
-
-
@@ -0,0 +1,102 @@
+"""
+Translations.
+
+static/translations.json is read once per process and compiled into one
+flat catalog per language ({"nav.upload": "Upload", ...}). Templates render
+strings server-side with t("nav.upload", "Upload"); the second argument is
+the text shown when no catalog has the key.
+
+The few strings built in the browser live under "client." and are served as
+a small per-language script whose URL carries a content fingerprint, so it
+can be cached forever and changes URL whenever the catalog does.
+"""
+import hashlib
+import json
+import os
+import threading
+
+from flask import request, session
+
+
+TRANSLATIONS_PATH = os.path.join(os.path.dirname(__file__), "static", "translations.json")
+DEFAULT_LANGUAGE = "en"
+CLIENT_PREFIX = "client."
+
+
+class Catalog(dict):
+    """Flat key -> string lookup for one language; call it to translate."""
+
+    def __init__(self, language, entries, fallback=None):
+        super().__init__(entries)
+        self.language = language
+        self.fallback = fallback
+
+    def __call__(self, key, default=None):
+        value = self.get(key)
+        if value is None:
+            value = default
+        if value is None and self.fallback is not None:
+            value = self.fallback.get(key)
+        return key if value is None else value
+
+
+def flatten(tree, prefix=""):
+    """{"nav": {"upload": "Upload"}} -> {"nav.upload": "Upload"}"""
+    flat = {}
+    for key, value in tree.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+class Translations:
+    def __init__(self, path=TRANSLATIONS_PATH):
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+
+        default = Catalog(DEFAULT_LANGUAGE, flatten(raw[DEFAULT_LANGUAGE]))
+        self.catalogs = {DEFAULT_LANGUAGE: default}
+        for language, tree in raw.items():
+            if language != DEFAULT_LANGUAGE:
+                self.catalogs[language] = Catalog(language, flatten(tree), fallback=default)
+
+        # language -> (fingerprint, script body)
+        self.bundles = {}
+        for language, catalog in self.catalogs.items():
+            keys = [key for key in default.keys() | catalog.keys() if key.startswith(CLIENT_PREFIX)]
+            strings = {key: catalog(key) for key in keys}
+            body = "window.I18N = %s;\n" % json.dumps(strings, ensure_ascii=False, sort_keys=True)
+            fingerprint = hashlib.sha256(body.encode("utf-8")).hexdigest()[:12]
+            self.bundles[language] = (fingerprint, body)
+
+    @property
+    def languages(self):
+        return tuple(self.catalogs)
+
+    def catalog(self, language):
+        return self.catalogs.get(language) or self.catalogs[DEFAULT_LANGUAGE]
+
+
+_translations = None
+_translations_lock = threading.Lock()
+
+
+def get_catalogs():
+    """The process-wide Translations, loaded on first use."""
+    global _translations
+    if _translations is None:
+        with _translations_lock:
+            if _translations is None:
+                _translations = Translations()
+    return _translations
+
+
+def request_language():
+    """Language picked in the navbar (lang cookie), else the user's, else English."""
+    languages = get_catalogs().languages
+    for language in (request.cookies.get("lang"), session.get("language")):
+        if language in languages:
+            return language
+    return DEFAULT_LANGUAGE
@@ -0,0 +1,251 @@
+"""
+Bulk importers for the admin Excel uploads (projects and BOM components)
+"""
+import time
+
+import psycopg2
+from openpyxl import load_workbook
+
+
+BATCH_SIZE = 1000
+
+UPSERT_PROJECTS = """
+    INSERT INTO projects (project_number, project_name, manager_id, customer_id, quantity)
+    VALUES %s
+    ON CONFLICT (project_number) DO UPDATE
+    SET project_name = EXCLUDED.project_name,
+        manager_id = EXCLUDED.manager_id,
+        customer_id = EXCLUDED.customer_id,
+        quantity = EXCLUDED.quantity
+"""
+
+# BOM sheet columns A:L, in order
+BOM_COLUMNS = [
+    "position_no", "component_no", "component_name", "unit_quantity", "total_quantity",
+    "weight", "description", "size", "materials", "machine_type", "notes", "working_area"
+]
+
+# BOM sheets carry a title block; the header is on row 7 and data starts on row 8
+BOM_FIRST_ROW = 8
+
+UPSERT_COMPONENTS = """
+    INSERT INTO components (group_id, position_no, component_no, component_name, unit_quantity,
+                            total_quantity, weight, description, size, materials, machine_type,
+                            notes, working_area)
+    VALUES %s
+    ON CONFLICT (group_id, position_no) DO UPDATE
+    SET component_no = EXCLUDED.component_no,
+        component_name = EXCLUDED.component_name,
+        unit_quantity = EXCLUDED.unit_quantity,
+        total_quantity = EXCLUDED.total_quantity,
+        weight = EXCLUDED.weight,
+        description = EXCLUDED.description,
+        size = EXCLUDED.size,
+        materials = EXCLUDED.materials,
+        machine_type = EXCLUDED.machine_type,
+        notes = EXCLUDED.notes,
+        working_area = EXCLUDED.working_area
+"""
+
+
+def _cell_str(value):
+    # Excel hands back whole numbers as floats (position 1 -> 1.0)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip() if value is not None and str(value).strip() else None
+
+
+def _cell_int(value):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(f"'{value}' is not a whole number")
+    return int(number)
+
+
+def _cell_float(value):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    return float(str(value).replace(",", "."))
+
+
+def _add(batch, key, idx, values, result, label):
+    """
+    Queue a row for the next _flush. A key already in the batch is replaced
+    by the later row (one statement can't upsert a row twice); the earlier
+    row is then never written, so it is counted and reported.
+    """
+    if key in batch:
+        earlier = batch.pop(key)[0]
+        result["duplicates"] += 1
+        result["errors"].append(f"Row {earlier}: Duplicate {label} '{key}', replaced by row {idx}")
+    batch[key] = (idx, values)
+
+
+def _flush(db, query, batch, result):
+    """
+    Write one batch of {key: (row_number, values)}. If the batch fails
+    (e.g. a duplicate project_name), retry its rows one at a time so the
+    bad row is reported and the rest still load.
+    """
+    try:
+        db.execute_values(query, [values for _, values in batch.values()])
+        result["rows_processed"] += len(batch)
+    except psycopg2.Error:
+        for idx, values in batch.values():
+            try:
+                db.execute_values(query, [values])
+                result["rows_processed"] += 1
+            except psycopg2.Error as e:
+                message = (e.pgerror or str(e)).strip().splitlines()[0]
+                result["errors"].append(f"Row {idx}: {message}")
+
+
+def _finish(result, started):
+    elapsed = time.monotonic() - started
+    result["elapsed"] = elapsed
+    result["rows_per_sec"] = result["rows_processed"] / elapsed if elapsed > 0 else 0.0
+    return result
+
+
+def import_projects(db, path, batch_size=BATCH_SIZE, progress=None):
+    """
+    Stream a projects workbook into the projects table.
+
+    Expected columns (header on row 1):
+        Project Number | Project Name | Manager Name | Customer Name | Quantity
+
+    Existing projects (matched on project_number) are updated. Returns a dict
+    with rows_total, rows_processed, errors (list of "Row N: ..." strings),
+    duplicates (rows replaced by a later row with the same project number,
+    also listed in errors), elapsed and rows_per_sec. If given, `progress(result)` is called after
+    every batch.
+    """
+    started = time.monotonic()
+    managers_dict = {m["manager_name"]: m["id"] for m in db.execute("SELECT id, manager_name FROM managers")}
+    customers_dict = {c["customer_name"]: c["id"] for c in db.execute("SELECT id, customer_name FROM customers")}
+
+    result = {"rows_total": None, "rows_processed": 0, "errors": [], "duplicates": 0}
+    # keyed on project_number: a row may not be upserted twice in one statement
+    batch = {}
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        if ws.max_row:
+            # from the sheet's stored dimensions; an estimate, blank rows included
+            result["rows_total"] = max(ws.max_row - 1, 0)
+
+        for idx, row in enumerate(ws.iter_rows(min_row=2, max_col=5, values_only=True), start=2):
+            if not any(row):  # Skip empty rows
+                continue
+            row = tuple(row) + (None,) * (5 - len(row))
+
+            project_number = _cell_str(row[0])
+            project_name = _cell_str(row[1])
+            manager_name = _cell_str(row[2])
+            customer_name = _cell_str(row[3])
+            quantity = row[4]
+
+            if not all([project_number, project_name, manager_name, customer_name, quantity]):
+                result["errors"].append(f"Row {idx}: Missing required fields")
+                continue
+
+            try:
+                quantity = int(quantity)
+            except (TypeError, ValueError):
+                result["errors"].append(f"Row {idx}: Quantity '{quantity}' is not a number")
+                continue
+
+            manager_id = managers_dict.get(manager_name)
+            customer_id = customers_dict.get(customer_name)
+            if not manager_id:
+                result["errors"].append(f"Row {idx}: Manager '{manager_name}' not found")
+                continue
+            if not customer_id:
+                result["errors"].append(f"Row {idx}: Customer '{customer_name}' not found")
+                continue
+
+            _add(batch, project_number, idx, (project_number, project_name, manager_id, customer_id, quantity),
+                 result, "project number")
+            if len(batch) >= batch_size:
+                _flush(db, UPSERT_PROJECTS, batch, result)
+                batch = {}
+                if progress:
+                    progress(result)
+
+        if batch:
+            _flush(db, UPSERT_PROJECTS, batch, result)
+    finally:
+        wb.close()
+
+    return _finish(result, started)
+
+
+def import_components(db, path, group_id, first_row=BOM_FIRST_ROW, batch_size=BATCH_SIZE, progress=None):
+    """
+    Stream a BOM workbook (columns A:L, see BOM_COLUMNS) into the components
+    table for one group.
+
+    Rows are matched on (group_id, position_no), so importing the same BOM
+    again updates the existing components instead of duplicating them.
+    Returns the same result dict as import_projects.
+    """
+    started = time.monotonic()
+    if not db.execute("SELECT id FROM groups WHERE id = %s", group_id):
+        raise ValueError(f"Group {group_id} not found")
+
+    result = {"rows_total": None, "rows_processed": 0, "errors": [], "duplicates": 0}
+    batch = {}
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        if ws.max_row:
+            result["rows_total"] = max(ws.max_row - first_row + 1, 0)
+
+        width = len(BOM_COLUMNS)
+        for idx, row in enumerate(ws.iter_rows(min_row=first_row, max_col=width, values_only=True), start=first_row):
+            if not any(row):  # Skip empty rows
+                continue
+            row = tuple(row) + (None,) * (width - len(row))
+
+            position_no = _cell_str(row[0])
+            if not position_no:
+                result["errors"].append(f"Row {idx}: Missing position number")
+                continue
+
+            try:
+                values = (
+                    group_id,
+                    position_no,
+                    _cell_str(row[1]),
+                    _cell_str(row[2]),
+                    _cell_int(row[3]),
+                    _cell_int(row[4]),
+                    _cell_float(row[5]),
+                    _cell_str(row[6]),
+                    _cell_str(row[7]),
+                    _cell_str(row[8]),
+                    _cell_str(row[9]),
+                    _cell_str(row[10]),
+                    _cell_str(row[11]),
+                )
+            except ValueError as e:
+                result["errors"].append(f"Row {idx}: {e}")
+                continue
+
+            _add(batch, position_no, idx, values, result, "position number")
+            if len(batch) >= batch_size:
+                _flush(db, UPSERT_COMPONENTS, batch, result)
+                batch = {}
+                if progress:
+                    progress(result)
+
+        if batch:
+            _flush(db, UPSERT_COMPONENTS, batch, result)
+    finally:
+        wb.close()
+
+    return _finish(result, started)
@@ -120,15 +120,222 @@ CREATE TABLE IF NOT EXISTS problem_steps (
     FOREIGN KEY (component_id) REFERENCES components(id)
 );
 
+-- Problem photos table (index of files saved under UPLOADS_DIR)
+CREATE TABLE IF NOT EXISTS problem_photos (
+    id SERIAL PRIMARY KEY,
+    problem_id INTEGER NOT NULL,
+    problem_component_id INTEGER,
+    file_path TEXT NOT NULL UNIQUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (problem_id) REFERENCES problems(id) ON DELETE CASCADE,
+    FOREIGN KEY (problem_component_id) REFERENCES problem_components(id) ON DELETE CASCADE
+);
+
+-- Thumbnail / web-sized variants, rendered in the background (photos.py)
+ALTER TABLE problem_photos ADD COLUMN IF NOT EXISTS thumb_path TEXT;
+ALTER TABLE problem_photos ADD COLUMN IF NOT EXISTS web_path TEXT;
+
+-- Hash of the data the DF report workbook on disk was rendered from (reports.py)
+ALTER TABLE problems ADD COLUMN IF NOT EXISTS report_signature TEXT;
+
+-- Summary of a problem's steps, kept current by the problem_steps triggers below
+ALTER TABLE problems ADD COLUMN IF NOT EXISTS current_status TEXT;
+ALTER TABLE problems ADD COLUMN IF NOT EXISTS last_step_at TIMESTAMP;
+
+-- Content-addressed upload storage (storage.py): one blob per distinct file content
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    size BIGINT NOT NULL,
+    refcount INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Logical upload paths (what problem_photos and /df/uploads/ use) -> blob
+CREATE TABLE IF NOT EXISTS upload_files (
+    path TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (sha256) REFERENCES blobs(sha256)
+);
+
+-- Server-side Flask sessions (sessions.py, SESSION_BACKEND=postgres)
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires_at TIMESTAMP NOT NULL
+);
+
+-- Background jobs table (worked by worker.py)
+CREATE TABLE IF NOT EXISTS jobs (
+    id SERIAL PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'finished', 'failed')),
+    payload JSONB NOT NULL DEFAULT '{}',
+    rows_total INTEGER,
+    rows_processed INTEGER NOT NULL DEFAULT 0,
+    errors JSONB NOT NULL DEFAULT '[]',
+    message TEXT,
+    user_id INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+
+-- Reference data version (refdata.py): any write to these tables bumps it and
+-- notifies every app process so their in-memory copies are reloaded
+CREATE SEQUENCE IF NOT EXISTS ref_data_version;
+
+CREATE OR REPLACE FUNCTION bump_ref_data_version() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('ref_data_changed', nextval('ref_data_version')::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER users_ref_data_changed AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON users
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_ref_data_version();
+CREATE OR REPLACE TRIGGER managers_ref_data_changed AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON managers
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_ref_data_version();
+CREATE OR REPLACE TRIGGER engineers_ref_data_changed AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON engineers
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_ref_data_version();
+CREATE OR REPLACE TRIGGER customers_ref_data_changed AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON customers
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_ref_data_version();
+CREATE OR REPLACE TRIGGER projects_ref_data_changed AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON projects
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_ref_data_version();
+CREATE OR REPLACE TRIGGER groups_ref_data_changed AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON groups
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_ref_data_version();
+CREATE OR REPLACE TRIGGER components_ref_data_changed AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON components
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_ref_data_version();
+
+-- Search (/df/search): tsvector columns kept current by triggers, plus trigram
+-- indexes so mistyped part numbers still match. 'simple' = no stemming or stop
+-- words, which suits part numbers and mixed Turkish/English text.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE components ADD COLUMN IF NOT EXISTS search_vector TSVECTOR;
+ALTER TABLE problem_components ADD COLUMN IF NOT EXISTS search_vector TSVECTOR;
+
+CREATE OR REPLACE FUNCTION components_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', COALESCE(NEW.component_no, '')), 'A') ||
+        setweight(to_tsvector('simple', COALESCE(NEW.component_name, '')), 'B');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION problem_components_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := to_tsvector('simple', COALESCE(NEW.description, ''));
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER components_search_vector
+    BEFORE INSERT OR UPDATE OF component_no, component_name ON components
+    FOR EACH ROW EXECUTE FUNCTION components_search_vector();
+CREATE OR REPLACE TRIGGER problem_components_search_vector
+    BEFORE INSERT OR UPDATE OF description ON problem_components
+    FOR EACH ROW EXECUTE FUNCTION problem_components_search_vector();
+
+-- Backfill rows written before the triggers existed (no-op afterwards)
+UPDATE components SET component_no = component_no WHERE search_vector IS NULL;
+UPDATE problem_components SET description = description WHERE search_vector IS NULL;
+
+-- Problem status summary (problems.current_status / last_step_at). A problem's
+-- current status is the latest step of each of its components; an open one
+-- (anything but Finished / Cancel) wins over closed ones; a problem without
+-- steps is Open. Statement-level
+-- triggers refresh every problem a statement touched once, in the same
+-- transaction as the step change.
+CREATE OR REPLACE FUNCTION refresh_problem_status(problem_ids INTEGER[]) RETURNS void AS $$
+    UPDATE problems p
+    SET current_status = COALESCE((
+            SELECT latest.status
+            FROM (
+                SELECT DISTINCT ON (ps.component_id) ps.status, ps.step_number, ps.id
+                FROM problem_steps ps
+                WHERE ps.problem_id = p.id
+                ORDER BY ps.component_id, ps.step_number DESC, ps.id DESC
+            ) latest
+            ORDER BY latest.status IN ('Finished', 'Cancel'), latest.step_number DESC, latest.id DESC
+            LIMIT 1
+        ), 'Open'),
+        last_step_at = (SELECT MAX(ps.created_at) FROM problem_steps ps WHERE ps.problem_id = p.id)
+    WHERE p.id = ANY(problem_ids);
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION problem_steps_refresh_status() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_problem_status(ARRAY(SELECT DISTINCT problem_id FROM new_steps));
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM refresh_problem_status(ARRAY(
+            SELECT problem_id FROM new_steps UNION SELECT problem_id FROM old_steps
+        ));
+    ELSE
+        PERFORM refresh_problem_status(ARRAY(SELECT DISTINCT problem_id FROM old_steps));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- (transition tables need one trigger per event)
+CREATE OR REPLACE TRIGGER problem_steps_status_insert AFTER INSERT ON problem_steps
+    REFERENCING NEW TABLE AS new_steps
+    FOR EACH STATEMENT EXECUTE FUNCTION problem_steps_refresh_status();
+CREATE OR REPLACE TRIGGER problem_steps_status_update AFTER UPDATE ON problem_steps
+    REFERENCING OLD TABLE AS old_steps NEW TABLE AS new_steps
+    FOR EACH STATEMENT EXECUTE FUNCTION problem_steps_refresh_status();
+CREATE OR REPLACE TRIGGER problem_steps_status_delete AFTER DELETE ON problem_steps
+    REFERENCING OLD TABLE AS old_steps
+    FOR EACH STATEMENT EXECUTE FUNCTION problem_steps_refresh_status();
+
+-- Backfill problems written before the triggers existed (no-op afterwards), then
+-- start new problems as Open until their first steps are inserted
+SELECT refresh_problem_status(ARRAY(SELECT id FROM problems WHERE current_status IS NULL));
+ALTER TABLE problems ALTER COLUMN current_status SET DEFAULT 'Open';
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_problems_user_id ON problems(user_id);
+CREATE INDEX IF NOT EXISTS idx_problems_user_created_at ON problems(user_id, created_at DESC, id DESC);
+-- BOM re-imports upsert on (group_id, position_no); deduplicate existing components before adding this to an old database
+CREATE UNIQUE INDEX IF NOT EXISTS idx_components_group_position ON components(group_id, position_no);
 CREATE INDEX IF NOT EXISTS idx_problems_project_id ON problems(project_id);
 CREATE INDEX IF NOT EXISTS idx_problems_group_id ON problems(group_id);
+CREATE INDEX IF NOT EXISTS idx_problems_created_at_id ON problems(created_at DESC, id DESC);
+-- Open problems (the predicate must match status_condition() / CLOSED_STATUSES in
+-- app.py), and counts / filters by status
+CREATE INDEX IF NOT EXISTS idx_problems_open ON problems(created_at DESC, id DESC)
+    WHERE current_status NOT IN ('Finished', 'Cancel');
+CREATE INDEX IF NOT EXISTS idx_problems_user_open ON problems(user_id, created_at DESC, id DESC)
+    WHERE current_status NOT IN ('Finished', 'Cancel');
+CREATE INDEX IF NOT EXISTS idx_problems_current_status ON problems(current_status, created_at DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_problem_components_problem_id ON problem_components(problem_id);
 CREATE INDEX IF NOT EXISTS idx_problem_components_component_id ON problem_components(component_id);
 CREATE INDEX IF NOT EXISTS idx_problem_steps_problem_id ON problem_steps(problem_id);
 CREATE INDEX IF NOT EXISTS idx_problem_steps_component_id ON problem_steps(component_id);
+CREATE INDEX IF NOT EXISTS idx_problem_steps_created_at_id ON problem_steps(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_problem_photos_problem_id ON problem_photos(problem_id);
+CREATE INDEX IF NOT EXISTS idx_problem_photos_problem_component_id ON problem_photos(problem_component_id);
 CREATE INDEX IF NOT EXISTS idx_users_role ON users(role);
+CREATE INDEX IF NOT EXISTS idx_upload_files_sha256 ON upload_files(sha256);
+CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at);
+CREATE INDEX IF NOT EXISTS idx_components_search_vector ON components USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_components_component_no_trgm ON components USING GIN (component_no gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_components_component_name_trgm ON components USING GIN (component_name gin_trgm_ops);
+-- Component typeahead on the upload form: case-insensitive prefixes within a
+-- group, and typo-tolerant trigram matches within a group (btree_gin lets one
+-- GIN index cover group_id and the trigrams)
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+CREATE INDEX IF NOT EXISTS idx_components_group_no_prefix ON components (group_id, lower(component_no) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_components_group_name_prefix ON components (group_id, lower(component_name) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_components_group_no_trgm ON components USING GIN (group_id, component_no gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_components_group_name_trgm ON components USING GIN (group_id, component_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_problem_components_search_vector ON problem_components USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_jobs_runnable ON jobs(id) WHERE status IN ('queued', 'running');
 
 -- Create default admin user (password: admin123 - CHANGE IN PRODUCTION!)
 -- Password hash for 'admin123' using werkzeug
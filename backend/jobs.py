@@ -0,0 +1,206 @@
+"""
+PostgreSQL-backed background jobs for Excel imports and other bulk operations.
+
+The web app only enqueues rows in the `jobs` table; `python worker.py` claims
+them with SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers can run
+next to any number of gunicorn processes.
+"""
+import json
+import os
+import time
+import traceback
+
+from importers import import_components, import_projects
+from photos import generate_variants
+from reports import DEFAULT_REPORTS_DIR, ensure_report
+from storage import Storage
+
+
+# Jobs still marked running after this long are assumed orphaned (worker died)
+# and are picked up again. Handlers must therefore be safe to re-run.
+STALE_AFTER = "10 minutes"
+
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    """Register a function(db, job_id, payload) as the handler for `kind`."""
+    def decorator(f):
+        JOB_HANDLERS[kind] = f
+        return f
+    return decorator
+
+
+def enqueue(db, kind, payload, user_id=None):
+    """Queue a job and return its id."""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"unknown job kind: {kind}")
+    rows = db.execute("""
+        INSERT INTO jobs (kind, payload, user_id)
+        VALUES (%s, %s::jsonb, %s)
+        RETURNING id
+    """, kind, json.dumps(payload), user_id)
+    return rows[0]["id"]
+
+
+def get_job(db, job_id):
+    rows = db.execute("""
+        SELECT id, kind, status, rows_total, rows_processed, errors, message,
+               created_at, started_at, finished_at, updated_at
+        FROM jobs
+        WHERE id = %s
+    """, job_id)
+    return rows[0] if rows else None
+
+
+def update_progress(db, job_id, rows_total=None, rows_processed=None, errors=None):
+    db.execute("""
+        UPDATE jobs
+        SET rows_total = COALESCE(%s, rows_total),
+            rows_processed = COALESCE(%s, rows_processed),
+            errors = COALESCE(%s::jsonb, errors),
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s
+    """, rows_total, rows_processed, json.dumps(errors) if errors is not None else None, job_id)
+
+
+def claim_next(db):
+    """Atomically mark the oldest runnable job as running and return it."""
+    rows = db.execute(f"""
+        UPDATE jobs
+        SET status = 'running',
+            started_at = CURRENT_TIMESTAMP,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = (
+            SELECT id FROM jobs
+            WHERE status = 'queued'
+               OR (status = 'running' AND updated_at < CURRENT_TIMESTAMP - INTERVAL '{STALE_AFTER}')
+            ORDER BY id
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING id, kind, payload
+    """)
+    return rows[0] if rows else None
+
+
+def run_job(db, job):
+    handler = JOB_HANDLERS.get(job["kind"])
+    try:
+        if handler is None:
+            raise ValueError(f"unknown job kind: {job['kind']}")
+        message = handler(db, job["id"], job["payload"])
+        status = "finished"
+    except Exception as e:
+        traceback.print_exc()
+        message = f"{type(e).__name__}: {e}"
+        status = "failed"
+
+    db.execute("""
+        UPDATE jobs
+        SET status = %s, message = %s,
+            finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE id = %s
+    """, status, message, job["id"])
+
+
+def work(db, poll_interval=2.0, once=False):
+    """Claim and run jobs until interrupted (or until the queue is empty if `once`)."""
+    while True:
+        job = claim_next(db)
+        if job is None:
+            if once:
+                return
+            db.release()
+            time.sleep(poll_interval)
+            continue
+        print(f"Running job {job['id']} ({job['kind']})", flush=True)
+        run_job(db, job)
+
+
+def job_status(job):
+    """JSON-friendly view of a job row for the status endpoint."""
+    errors = job["errors"] or []
+    total = job["rows_total"]
+    done = job["rows_processed"] + len(errors)
+    if job["status"] == "finished":
+        progress = 1.0
+    elif total:
+        progress = min(done / total, 1.0)
+    else:
+        progress = 0.0
+
+    elapsed = None
+    if job["started_at"]:
+        end = job["finished_at"] or job["updated_at"]
+        elapsed = (end - job["started_at"]).total_seconds()
+
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": progress,
+        "rows_total": total,
+        "rows_processed": job["rows_processed"],
+        "error_count": len(errors),
+        "errors": errors[:50],
+        "message": job["message"],
+        "elapsed": elapsed,
+        "rows_per_sec": job["rows_processed"] / elapsed if elapsed else None,
+        "created_at": job["created_at"].isoformat() if job["created_at"] else None,
+        "finished_at": job["finished_at"].isoformat() if job["finished_at"] else None,
+    }
+
+
+# -------------------- HANDLERS --------------------
+
+def _run_import(db, job_id, path, importer, **kwargs):
+    """Run an importers.* function on an uploaded file, reporting progress on the job."""
+    def progress(result):
+        update_progress(db, job_id, result["rows_total"], result["rows_processed"], result["errors"])
+
+    try:
+        result = importer(db, path, progress=progress, **kwargs)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+    update_progress(db, job_id, result["rows_total"], result["rows_processed"], result["errors"])
+    return (f"Processed {result['rows_processed']} rows in {result['elapsed']:.1f}s "
+            f"({result['rows_per_sec']:.0f} rows/s), {len(result['errors'])} errors "
+            f"({result['duplicates']} duplicate rows)")
+
+
+@job_handler("import_projects")
+def import_projects_job(db, job_id, payload):
+    return _run_import(db, job_id, payload["path"], import_projects)
+
+
+@job_handler("import_components")
+def import_components_job(db, job_id, payload):
+    return _run_import(db, job_id, payload["path"], import_components, group_id=payload["group_id"])
+
+
+@job_handler("photo_variants")
+def photo_variants_job(db, job_id, payload):
+    # reporting per chunk keeps updated_at moving, so a long job is not taken for a stale one
+    def progress(processed, total):
+        update_progress(db, job_id, total, processed)
+
+    done, failed = generate_variants(db, Storage(payload["uploads_dir"]), payload.get("photo_ids"), progress=progress)
+    update_progress(db, job_id, done + failed, done + failed)
+    return f"Rendered variants for {done} photos, {failed} failed"
+
+
+@job_handler("df_report")
+def df_report_job(db, job_id, payload):
+    storage = Storage(payload["uploads_dir"])
+    # jobs queued before reports moved out of UPLOADS_DIR carry no reports_dir
+    reports_dir = payload.get("reports_dir") or os.environ.get("REPORTS_DIR", DEFAULT_REPORTS_DIR)
+    problem_ids = payload["problem_ids"]
+    rendered = 0
+    for n, problem_id in enumerate(problem_ids, start=1):
+        if ensure_report(db, storage, reports_dir, problem_id):
+            rendered += 1
+        update_progress(db, job_id, len(problem_ids), n)
+    return f"Rendered {rendered} DF reports, {len(problem_ids) - rendered} unchanged"
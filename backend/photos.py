@@ -0,0 +1,113 @@
+"""
+Photo variants: small thumbnails and web-sized copies of uploaded originals.
+
+Originals stay untouched at <df>/component_<id>/pictures/<name>. Variants
+get the logical paths <df>/component_<id>/thumbs/<stem>.jpg and .../web/,
+are stored through storage.Storage like any other upload, and are rotated
+according to their EXIF orientation and stripped of metadata.
+"""
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+
+# variant name -> bounding box (the image keeps its aspect ratio)
+VARIANTS = {
+    "thumb": (480, 480),
+    "web": (1600, 1600),
+}
+
+JPEG_QUALITY = {
+    "thumb": 75,
+    "web": 85,
+}
+
+PHOTO_WORKERS = int(os.environ.get("PHOTO_WORKERS", 4))
+# photos resolved, rendered and recorded (and reported to `progress`) at a time;
+# bounds how many rendered variants are held in memory
+PROGRESS_EVERY = 50
+
+
+def variant_path(file_path, variant):
+    """df_x/component_1/pictures/a.png -> df_x/component_1/thumbs/a.jpg"""
+    pictures_dir, name = os.path.split(file_path)
+    stem = os.path.splitext(name)[0]
+    variant_dir = os.path.join(os.path.dirname(pictures_dir), f"{variant}s" if variant == "thumb" else variant)
+    return os.path.join(variant_dir, f"{stem}.jpg").replace(os.sep, "/")
+
+
+def render_variants(path):
+    """Render every variant of the original at `path`. Returns {variant: JPEG bytes}."""
+    rendered = {}
+    with Image.open(path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        for variant, size in VARIANTS.items():
+            resized = image.copy()
+            resized.thumbnail(size, Image.LANCZOS)
+            buffer = io.BytesIO()
+            # saving without exif= drops the metadata (GPS, camera, ...)
+            resized.save(buffer, "JPEG", quality=JPEG_QUALITY[variant], optimize=True)
+            rendered[variant] = buffer
+    return rendered
+
+
+def generate_variants(db, storage, photo_ids=None, workers=PHOTO_WORKERS, progress=None):
+    """
+    Create variants for the given problem_photos ids (or for every photo
+    that has none yet) and record them in the database. Images are decoded
+    and resized on a thread pool; storage and database writes stay on the
+    calling thread. Photos go through in chunks of PROGRESS_EVERY (one path
+    lookup and one UPDATE each), after which progress(processed, total) is
+    called if given. Returns (done, failed) counts.
+    """
+    if photo_ids is None:
+        photos = db.execute("SELECT id, file_path FROM problem_photos WHERE thumb_path IS NULL ORDER BY id")
+    else:
+        photos = db.execute("SELECT id, file_path FROM problem_photos WHERE id = ANY(%s)", list(photo_ids))
+
+    def render(source):
+        photo, path = source
+        if path is None:
+            print(f"Could not render variants for {photo['file_path']}: file not found", flush=True)
+            return photo, None
+        try:
+            return photo, render_variants(path)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            print(f"Could not render variants for {photo['file_path']}: {e}", flush=True)
+            return photo, None
+
+    def record(rows):
+        if rows:
+            db.execute_values("""
+                UPDATE problem_photos AS pp
+                SET thumb_path = v.thumb_path, web_path = v.web_path
+                FROM (VALUES %s) AS v (id, thumb_path, web_path)
+                WHERE pp.id = v.id
+            """, rows)
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(photos), PROGRESS_EVERY):
+            chunk = photos[start:start + PROGRESS_EVERY]
+            resolved = storage.resolve_many(db, [photo["file_path"] for photo in chunk])
+            sources = [(photo, resolved[photo["file_path"]][0]) for photo in chunk]
+
+            rows = []
+            for photo, rendered in pool.map(render, sources):
+                if rendered is None:
+                    continue
+                paths = {variant: variant_path(photo["file_path"], variant) for variant in rendered}
+                with db.transaction() as tx:
+                    storage.save_many(tx, [(paths[variant], buffer) for variant, buffer in rendered.items()])
+                rows.append((photo["id"], paths["thumb"], paths["web"]))
+
+            record(rows)
+            done += len(rows)
+            if progress:
+                progress(start + len(chunk), len(photos))
+    return done, len(photos) - done
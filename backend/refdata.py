@@ -0,0 +1,214 @@
+"""
+In-process cache of reference data (managers, customers, projects, groups,
+components, users).
+
+These tables only change through the admin page, BOM/project imports and
+registration, but were re-queried on every upload and admin request. Every
+write to them bumps the ref_data_version sequence and sends
+NOTIFY ref_data_changed (statement-level triggers in init_db.sql), whoever
+makes it - a gunicorn worker or worker.py. Each process keeps one LISTEN
+connection; a notification moves its version forward, which invalidates
+every entry loaded under an older version.
+
+Entries also expire after REF_DATA_TTL seconds, or after the much shorter
+REF_DATA_FALLBACK_TTL while the LISTEN connection is down, so a missed
+notification can only serve stale data for a bounded time.
+
+Cached rows are shared between requests: treat them as read-only.
+"""
+import logging
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+
+import psycopg2
+
+
+CHANNEL = "ref_data_changed"
+
+# name -> query; the column sets cover every page that uses them
+QUERIES = {
+    "managers": "SELECT id, manager_name, manager_mail FROM managers ORDER BY manager_name",
+    "customers": "SELECT id, customer_name, customer_country FROM customers ORDER BY customer_name",
+    "users": "SELECT id, username FROM users ORDER BY username",
+    "projects": """
+        SELECT p.id, p.project_number, p.project_name, p.quantity,
+               m.id AS manager_id, m.manager_name,
+               c.id AS customer_id, c.customer_name, c.customer_country
+        FROM projects p
+        JOIN managers m ON p.manager_id = m.id
+        JOIN customers c ON p.customer_id = c.id
+        ORDER BY p.project_number
+    """,
+    "groups": """
+        SELECT g.id, g.project_id, g.group_number, g.group_name, e.engineer_name, e.id AS engineer_id
+        FROM groups g
+        JOIN engineers e ON g.engineer_id = e.id
+        ORDER BY g.project_id, g.group_number
+    """,
+    "components": """
+        SELECT id, group_id, position_no, component_no, component_name, unit_quantity,
+               total_quantity, weight, description, size, materials,
+               machine_type, notes, working_area
+        FROM components
+        ORDER BY group_id, component_no
+    """,
+}
+
+logger = logging.getLogger(__name__)
+
+
+class ReferenceCache:
+    def __init__(self, db, ttl=None, fallback_ttl=None, retry_interval=5.0):
+        self.db = db
+        self.ttl = float(ttl if ttl is not None else os.environ.get("REF_DATA_TTL", 300))
+        self.fallback_ttl = float(fallback_ttl if fallback_ttl is not None
+                                  else os.environ.get("REF_DATA_FALLBACK_TTL", 30))
+        self.retry_interval = retry_interval
+
+        self.version = 0
+        self.listening = False
+        self.invalidated_at = 0.0   # monotonic time of the last invalidate()
+        self._entries = {}      # name -> (version, loaded_at, value)
+        self._lock = threading.Lock()
+        self._listener_pid = None
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, name, loader=None):
+        """
+        Cached value for `name`. Without a loader, `name` must be one of
+        QUERIES; with one, loader() computes the value (it may call get()).
+        """
+        self._ensure_listener()
+        ttl = self.ttl if self.listening else self.fallback_ttl
+
+        entry = self._entries.get(name)
+        if entry is not None:
+            version, loaded_at, value = entry
+            if version == self.version and time.monotonic() - loaded_at < ttl:
+                with self._lock:
+                    self._stats["hits"] += 1
+                return value
+
+        # tag with the version seen *before* loading, so a change that lands
+        # while we query makes this entry stale immediately
+        version = self.version
+        # from the primary: a lagging replica would cache pre-NOTIFY data for a whole TTL
+        with self.db.primary():
+            value = loader() if loader is not None else self.db.execute(QUERIES[name])
+        with self._lock:
+            self._stats["misses"] += 1
+            self._entries[name] = (version, time.monotonic(), value)
+        return value
+
+    def invalidate(self):
+        """Drop everything now (used by this process right after its own writes)."""
+        with self._lock:
+            self._entries = {}
+            self.invalidated_at = time.monotonic()
+            self._stats["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot.update({
+                "version": self.version,
+                "listening": self.listening,
+                "entries": sorted(self._entries),
+            })
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_ratio"] = snapshot["hits"] / lookups if lookups else 0.0
+        return snapshot
+
+    def _set_version(self, version):
+        with self._lock:
+            if version > self.version:
+                self.version = version
+                self._stats["invalidations"] += 1
+
+    def _ensure_listener(self):
+        # one listener per process; gunicorn forks workers after import
+        if self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            self.listening = False
+        threading.Thread(target=self._listen, name="ref-data-listener", daemon=True).start()
+
+    def _listen(self):
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.db.database_url)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CHANNEL}")
+                    # anything changed while we were not listening counts as a change
+                    cur.execute("SELECT last_value FROM ref_data_version")
+                    self._set_version(cur.fetchone()[0])
+                self.listening = True
+
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self._set_version(int(notify.payload))
+            except (psycopg2.Error, OSError, ValueError) as e:
+                logger.warning("Reference data listener disconnected: %s", e)
+            finally:
+                self.listening = False
+                if conn is not None and not conn.closed:
+                    conn.close()
+            time.sleep(self.retry_interval)
+
+
+class LRUCache:
+    """
+    Bounded cache for results derived from reference data, e.g. component
+    suggestions per (group, prefix). Entries are dropped with the
+    ReferenceCache they depend on (same version and TTL rules), and the least
+    recently used ones go first once `maxsize` is reached.
+    """
+
+    def __init__(self, ref_cache, maxsize=2048):
+        self.ref_cache = ref_cache
+        self.maxsize = maxsize
+        self._entries = OrderedDict()      # key -> (version, loaded_at, value)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get(self, key, loader):
+        ref = self.ref_cache
+        ref._ensure_listener()
+        ttl = ref.ttl if ref.listening else ref.fallback_ttl
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is not None and entry[0] == ref.version and entry[1] > ref.invalidated_at
+                    and time.monotonic() - entry[1] < ttl):
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[2]
+
+        version = ref.version
+        value = loader()
+        with self._lock:
+            self._stats["misses"] += 1
+            self._entries[key] = (version, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats, size=len(self._entries), maxsize=self.maxsize)
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_ratio"] = snapshot["hits"] / lookups if lookups else 0.0
+        return snapshot
@@ -0,0 +1,215 @@
+"""
+DF report workbooks.
+
+Each problem gets the workbook its problem_steps.df_filename names, stored
+as <REPORTS_DIR>/<df_number>.xlsx: a header sheet, the reported components,
+the steps and the photo thumbnails. REPORTS_DIR is kept out of UPLOADS_DIR,
+which /df/uploads serves to anyone with a cache lifetime of a year; reports
+are only sent by /df/problems/<id>/report.xlsx, to the owner or an admin.
+
+Workbooks are written in openpyxl write-only mode by worker.py ("df_report"
+jobs), so any number of worker processes render in parallel. A workbook is
+only rebuilt when the problem changed: problems.report_signature holds a
+hash of the data the file on disk was rendered from.
+"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+
+from openpyxl import Workbook
+from openpyxl.drawing.image import Image as SheetImage
+from PIL import Image
+
+from photos import render_variants
+
+
+DEFAULT_REPORTS_DIR = os.path.join(os.path.dirname(__file__), "reports")
+REPORT_THUMB_WIDTH = 240
+# default row height in pixels, used to leave room under each embedded photo
+ROW_HEIGHT_PX = 20
+
+
+def load_report_data(db, problem_id):
+    """Everything a report shows, as plain JSON-friendly data (None if the problem is gone)."""
+    problem = db.execute("""
+        SELECT p.id, p.user_id, p.created_at, p.planned_closing_date, p.report_signature,
+               pj.project_number, pj.project_name, c.customer_name, m.manager_name,
+               g.group_number, g.group_name, e.engineer_name, u.username,
+               (
+                   SELECT ps.df_filename
+                   FROM problem_steps ps
+                   WHERE ps.problem_id = p.id
+                   ORDER BY ps.step_number, ps.id
+                   LIMIT 1
+               ) AS df_filename
+        FROM problems p
+        JOIN projects pj ON p.project_id = pj.id
+        JOIN customers c ON pj.customer_id = c.id
+        JOIN managers m ON pj.manager_id = m.id
+        JOIN groups g ON p.group_id = g.id
+        JOIN engineers e ON g.engineer_id = e.id
+        JOIN users u ON p.user_id = u.id
+        WHERE p.id = %s
+    """, problem_id)
+    if not problem or not problem[0]["df_filename"]:
+        return None
+    problem = dict(problem[0])
+
+    components = db.execute("""
+        SELECT pc.id, c.component_no, c.component_name, pc.reason, pc.department,
+               pc.action, pc.priority, pc.description
+        FROM problem_components pc
+        JOIN components c ON pc.component_id = c.id
+        WHERE pc.problem_id = %s
+        ORDER BY pc.id
+    """, problem_id)
+    steps = db.execute("""
+        SELECT ps.step_number, c.component_no, ps.quantity, ps.action, ps.status,
+               ps.planned_closing_date, ps.action_after_report, ps.created_at
+        FROM problem_steps ps
+        JOIN components c ON ps.component_id = c.id
+        WHERE ps.problem_id = %s
+        ORDER BY ps.step_number, ps.id
+    """, problem_id)
+    photos = db.execute("""
+        SELECT problem_component_id, file_path, thumb_path
+        FROM problem_photos
+        WHERE problem_id = %s
+        ORDER BY problem_component_id, id
+    """, problem_id)
+
+    return {
+        "problem": problem,
+        "df_number": os.path.splitext(problem["df_filename"])[0],
+        "components": [dict(row) for row in components],
+        "steps": [dict(row) for row in steps],
+        "photos": [dict(row) for row in photos],
+    }
+
+
+def report_signature(data):
+    """
+    Hash of the report content. Photo files never change under a given path,
+    and a thumbnail being rendered later does not change the report either.
+    """
+    content = dict(data)
+    content["problem"] = {k: v for k, v in data["problem"].items() if k != "report_signature"}
+    content["photos"] = [(photo["problem_component_id"], photo["file_path"]) for photo in data["photos"]]
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def report_path(reports_dir, df_number):
+    return os.path.join(reports_dir, f"{df_number}.xlsx")
+
+
+def _thumbnail(db, storage, photo):
+    """PNG bytes of a photo's thumbnail (rendered from the original if the worker has not yet)."""
+    path = storage.resolve(db, photo["thumb_path"])[0] if photo["thumb_path"] else None
+    if path is not None:
+        with open(path, "rb") as f:
+            data = io.BytesIO(f.read())
+    else:
+        original = storage.resolve(db, photo["file_path"])[0]
+        if original is None:
+            return None
+        data = render_variants(original)["thumb"]
+
+    with Image.open(data) as image:
+        image.thumbnail((REPORT_THUMB_WIDTH, REPORT_THUMB_WIDTH * 4))
+        output = io.BytesIO()
+        image.save(output, "PNG")
+    return output
+
+
+def render_report(db, storage, data, path):
+    """Write the workbook for `data` to `path` (atomically)."""
+    problem = data["problem"]
+    workbook = Workbook(write_only=True)
+
+    header = workbook.create_sheet("Report")
+    for label, value in (
+        ("DF", data["df_number"]),
+        ("Project", f"{problem['project_number']} - {problem['project_name']}"),
+        ("Customer", problem["customer_name"]),
+        ("Manager", problem["manager_name"]),
+        ("Group", f"{problem['group_number']} - {problem['group_name']}"),
+        ("Engineer", problem["engineer_name"]),
+        ("Reported by", problem["username"]),
+        ("Reported at", problem["created_at"]),
+        ("Planned closing date", problem["planned_closing_date"]),
+    ):
+        header.append([label, value])
+
+    components = workbook.create_sheet("Components")
+    components.append(["Component No", "Component Name", "Reason", "Department", "Action", "Priority", "Description"])
+    component_no = {}
+    for row in data["components"]:
+        component_no[row["id"]] = row["component_no"]
+        components.append([row["component_no"], row["component_name"], row["reason"], row["department"],
+                           row["action"], row["priority"], row["description"]])
+
+    steps = workbook.create_sheet("Steps")
+    steps.append(["Step", "Component No", "Quantity", "Action", "Status", "Planned Closing Date",
+                  "Action After Report", "Created At"])
+    for row in data["steps"]:
+        steps.append([row["step_number"], row["component_no"], row["quantity"], row["action"], row["status"],
+                      row["planned_closing_date"], row["action_after_report"], row["created_at"]])
+
+    if data["photos"]:
+        # write-only sheets cannot size rows, so each image gets enough default-height rows
+        sheet = workbook.create_sheet("Photos")
+        sheet.append(["Component No", "File"])
+        row_no = 2
+        for photo in data["photos"]:
+            try:
+                thumbnail = _thumbnail(db, storage, photo)
+            except (OSError, ValueError, Image.DecompressionBombError):
+                thumbnail = None
+            sheet.append([component_no.get(photo["problem_component_id"]), photo["file_path"]])
+            if thumbnail is None:
+                row_no += 1
+                continue
+            image = SheetImage(thumbnail)
+            sheet.add_image(image, f"C{row_no}")
+            rows = image.height // ROW_HEIGHT_PX + 1
+            for _ in range(rows - 1):
+                sheet.append([])
+            row_no += rows
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-", suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook.save(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def current_report(db, reports_dir, problem_id, data=None):
+    """
+    (path, data) for a problem's report; path is None when the file is
+    missing or older than the problem's data, data is None when there is
+    no such problem.
+    """
+    data = data or load_report_data(db, problem_id)
+    if data is None:
+        return None, None
+    path = report_path(reports_dir, data["df_number"])
+    if data["problem"]["report_signature"] == report_signature(data) and os.path.exists(path):
+        return path, data
+    return None, data
+
+
+def ensure_report(db, storage, reports_dir, problem_id):
+    """Render the report unless it is current. Returns True if it was (re)rendered."""
+    path, data = current_report(db, reports_dir, problem_id)
+    if path is not None or data is None:
+        return False
+    os.makedirs(reports_dir, exist_ok=True)
+    render_report(db, storage, data, report_path(reports_dir, data["df_number"]))
+    db.execute("UPDATE problems SET report_signature = %s WHERE id = %s", report_signature(data), problem_id)
+    return True
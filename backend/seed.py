@@ -0,0 +1,230 @@
+"""
+Fill the database with synthetic data at production-like volumes.
+
+    python seed.py --projects 200 --problems 20000
+
+Creates managers, engineers, customers, users (one admin), projects, groups,
+components, problems with their problem_components and problem_steps, and
+photo files (stored through storage.Storage like real uploads, so a handful
+of distinct images cover any number of photos). Every name starts with
+--prefix, so seeding twice with different prefixes does not collide.
+
+All users get the password given by --password; the admin is
+<prefix>_admin. bench_routes.py logs in as that user.
+"""
+import argparse
+import io
+import random
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+from PIL import Image, ImageDraw
+from werkzeug.security import generate_password_hash
+
+from db import Database
+from dropdowns import action, department, priority, reasons, status
+from photos import generate_variants
+from storage import Storage
+
+
+BATCH_SIZE = 500
+
+
+def make_photos(count, size=(1600, 1200)):
+    """`count` distinct JPEGs (as bytes), roughly the size of a phone photo."""
+    photos = []
+    for n in range(count):
+        image = Image.new("RGB", size, (40 + n * 37 % 200, 90 + n * 53 % 150, 60 + n * 71 % 180))
+        draw = ImageDraw.Draw(image)
+        for i in range(0, size[0], 80):
+            draw.line([(i, 0), (size[0] - i, size[1])], fill=(255, 255, 255), width=3)
+        draw.text((40, 40), f"seed photo {n}", fill=(0, 0, 0))
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=85)
+        photos.append(buffer.getvalue())
+    return photos
+
+
+def insert_returning_ids(db, query, rows):
+    with db.transaction() as tx:
+        return [row["id"] for row in tx.execute_values(query, rows, fetch=True)]
+
+
+def seed_reference_data(db, args, rnd):
+    p = args.prefix
+    manager_ids = insert_returning_ids(db, """
+        INSERT INTO managers (manager_name, manager_mail) VALUES %s RETURNING id
+    """, [(f"{p} Manager {i}", f"{p}.manager{i}@example.com") for i in range(args.managers)])
+    engineer_ids = insert_returning_ids(db, """
+        INSERT INTO engineers (engineer_name, engineer_mail) VALUES %s RETURNING id
+    """, [(f"{p} Engineer {i}", f"{p}.engineer{i}@example.com") for i in range(args.engineers)])
+    customer_ids = insert_returning_ids(db, """
+        INSERT INTO customers (customer_name, customer_country) VALUES %s RETURNING id
+    """, [(f"{p} Customer {i}", rnd.choice(["TR", "ES", "DE", "US", "IT"])) for i in range(args.customers)])
+
+    # hashing is deliberately slow, so every user shares one hash
+    password_hash = generate_password_hash(args.password)
+    user_ids = insert_returning_ids(db, """
+        INSERT INTO users (username, password_hash, role) VALUES %s RETURNING id
+    """, [(f"{p}_admin", password_hash, "admin")] +
+         [(f"{p}_user{i}", password_hash, "user") for i in range(args.users)])
+
+    project_ids = insert_returning_ids(db, """
+        INSERT INTO projects (project_number, project_name, manager_id, customer_id, quantity)
+        VALUES %s RETURNING id
+    """, [(f"{p}-P{i:05d}", f"{p} Project {i}", rnd.choice(manager_ids), rnd.choice(customer_ids), rnd.randint(1, 20))
+          for i in range(args.projects)])
+
+    group_rows, group_projects = [], []
+    for project_id in project_ids:
+        for g in range(args.groups_per_project):
+            group_rows.append((project_id, rnd.choice(engineer_ids), f"Group {g}", f"G{g:03d}"))
+            group_projects.append(project_id)
+    group_ids = insert_returning_ids(db, """
+        INSERT INTO groups (project_id, engineer_id, group_name, group_number) VALUES %s RETURNING id
+    """, group_rows)
+
+    component_rows = []
+    for group_id in group_ids:
+        for c in range(args.components_per_group):
+            component_rows.append((
+                group_id, str(c + 1), f"{p}-{group_id}-{c:04d}", f"Component {c} of group {group_id}",
+                rnd.randint(1, 10), rnd.randint(1, 200), round(rnd.uniform(0.1, 50), 2),
+                "Synthetic component", f"{rnd.randint(10, 900)}x{rnd.randint(10, 900)}", "S235",
+                "CNC", "", "Assembly",
+            ))
+    component_ids = insert_returning_ids(db, """
+        INSERT INTO components
+        (group_id, position_no, component_no, component_name, unit_quantity, total_quantity, weight,
+         description, size, materials, machine_type, notes, working_area)
+        VALUES %s RETURNING id
+    """, component_rows)
+
+    components_by_group = {}
+    for (group_id, *_), component_id in zip(component_rows, component_ids):
+        components_by_group.setdefault(group_id, []).append(component_id)
+    groups = list(zip(group_ids, group_projects))
+    return user_ids, groups, components_by_group
+
+
+def seed_problems(db, storage, args, rnd, user_ids, groups, components_by_group):
+    photos = make_photos(args.distinct_photos) if args.photo_ratio > 0 else []
+    step_statuses = ["Open"] + [s["default"] for s in status]
+    now = datetime.now()
+    photo_ids = []
+    done = 0
+
+    # problems are only reported on groups that have components (--components-per-group may be 0)
+    groups = [grp for grp in groups if components_by_group.get(grp[0])]
+    if not groups:
+        print("  problems: skipped, no group has components", flush=True)
+        return photo_ids
+
+    while done < args.problems:
+        count = min(BATCH_SIZE, args.problems - done)
+        with db.transaction() as tx:
+            problem_rows = []
+            for _ in range(count):
+                group_id, project_id = rnd.choice(groups)
+                created_at = now - timedelta(seconds=rnd.randint(0, args.days * 86400))
+                problem_rows.append((project_id, group_id, rnd.choice(user_ids), created_at,
+                                     (created_at + timedelta(days=rnd.randint(7, 60))).date()))
+            problem_ids = [row["id"] for row in tx.execute_values("""
+                INSERT INTO problems (project_id, group_id, user_id, created_at, planned_closing_date)
+                VALUES %s RETURNING id
+            """, problem_rows, fetch=True)]
+
+            component_rows = []
+            for problem_id, (_, group_id, _, created_at, closing) in zip(problem_ids, problem_rows):
+                candidates = components_by_group.get(group_id, [])
+                picks = rnd.sample(candidates, min(args.components_per_problem, len(candidates)))
+                for component_id in picks:
+                    component_rows.append((
+                        problem_id, component_id, rnd.choice(reasons)["key"], rnd.choice(department)["key"],
+                        rnd.choice(action)["key"], rnd.choice(priority)["key"],
+                        f"Synthetic problem {problem_id} on component {component_id}",
+                        created_at, closing,
+                    ))
+            pc_ids = [row["id"] for row in tx.execute_values("""
+                INSERT INTO problem_components
+                (problem_id, component_id, reason, department, action, priority, description)
+                VALUES %s RETURNING id
+            """, [row[:7] for row in component_rows], fetch=True)]
+
+            step_rows, photo_rows, photo_files = [], [], []
+            for pc_id, (problem_id, component_id, _, _, action_v, _, _, created_at, closing) in zip(pc_ids, component_rows):
+                df_number = f"df_{created_at:%d%m%y%H%M%S}_{problem_id}"
+                for step in range(1, args.steps_per_component + 1):
+                    step_rows.append((
+                        problem_id, component_id, step, f"{df_number}.xlsx", rnd.randint(1, 5), action_v,
+                        rnd.choice(step_statuses), closing, None, created_at + timedelta(hours=step - 1),
+                    ))
+                if photos and rnd.random() < args.photo_ratio:
+                    file_path = f"{df_number}/component_{pc_id}/pictures/comp_{pc_id}_1.jpg"
+                    photo_files.append((file_path, io.BytesIO(rnd.choice(photos))))
+                    photo_rows.append((problem_id, pc_id, file_path))
+
+            storage.save_many(tx, photo_files)
+            tx.execute_values("""
+                INSERT INTO problem_steps
+                (problem_id, component_id, step_number, df_filename, quantity, action, status,
+                 planned_closing_date, action_after_report, created_at)
+                VALUES %s
+            """, step_rows)
+            photo_ids += [row["id"] for row in tx.execute_values("""
+                INSERT INTO problem_photos (problem_id, problem_component_id, file_path)
+                VALUES %s RETURNING id
+            """, photo_rows, fetch=True)]
+
+        done += count
+        print(f"  problems: {done}/{args.problems}", flush=True)
+    return photo_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--prefix", default=f"seed{datetime.now():%y%m%d%H%M%S}", help="name prefix for this run")
+    parser.add_argument("--password", default="seed", help="password of every seeded user")
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--managers", type=int, default=20)
+    parser.add_argument("--engineers", type=int, default=30)
+    parser.add_argument("--customers", type=int, default=50)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--projects", type=int, default=200)
+    parser.add_argument("--groups-per-project", type=int, default=5)
+    parser.add_argument("--components-per-group", type=int, default=40)
+    parser.add_argument("--problems", type=int, default=5000)
+    parser.add_argument("--components-per-problem", type=int, default=3)
+    parser.add_argument("--steps-per-component", type=int, default=2)
+    parser.add_argument("--days", type=int, default=365, help="spread problems over this many past days")
+    parser.add_argument("--photo-ratio", type=float, default=0.3, help="share of problem components with a photo")
+    parser.add_argument("--distinct-photos", type=int, default=25)
+    parser.add_argument("--variants", action="store_true", help="also render thumbnail/web variants")
+    parser.add_argument("--uploads-dir", default=None, help="defaults to UPLOADS_DIR / the app's default")
+    args = parser.parse_args()
+
+    load_dotenv()
+    # imported here so the uploads directory resolves exactly as in the app
+    from app import UPLOADS_DIR
+
+    rnd = random.Random(args.random_seed)
+    db = Database(minconn=1, maxconn=2)
+    storage = Storage(args.uploads_dir or UPLOADS_DIR)
+    started = time.perf_counter()
+
+    print(f"Seeding with prefix {args.prefix!r}")
+    user_ids, groups, components_by_group = seed_reference_data(db, args, rnd)
+    print(f"  {len(groups)} groups, {sum(map(len, components_by_group.values()))} components, {len(user_ids)} users")
+    photo_ids = seed_problems(db, storage, args, rnd, user_ids, groups, components_by_group)
+    print(f"  {len(photo_ids)} photos")
+    if args.variants and photo_ids:
+        done, failed = generate_variants(db, storage, photo_ids)
+        print(f"  variants: {done} rendered, {failed} failed")
+
+    print(f"Done in {time.perf_counter() - started:.1f}s; log in as {args.prefix}_admin / {args.password}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Session backends.
+
+SESSION_BACKEND selects how `flask.session` is stored:
+  "postgres"   - server-side, in the sessions table (default; shared by all
+                 gunicorn workers and containers)
+  "cookie"     - Flask's signed cookie; no server-side I/O at all
+  "filesystem" - Flask-Session files under flask_session/ (the old behaviour)
+
+The postgres backend only writes when the session was changed during the
+request, or when it is past half its lifetime and needs its expiry pushed
+back. Expired rows are deleted in small batches, at most once per
+SESSION_CLEANUP_INTERVAL seconds per process, and by `flask cleanup-sessions`.
+"""
+import os
+import secrets
+import threading
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+
+SESSION_BACKENDS = ("postgres", "cookie", "filesystem")
+CLEANUP_BATCH_SIZE = 1000
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its id and whether it was changed."""
+
+    def __init__(self, initial=None, sid=None, new=False, ttl=None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.ttl = ttl          # seconds left before the stored row expires
+        self.modified = False
+
+
+def cleanup_expired(db, batch_size=CLEANUP_BATCH_SIZE):
+    """Delete up to `batch_size` expired sessions; return how many went."""
+    return db.execute("""
+        WITH expired AS (
+            DELETE FROM sessions
+            WHERE id IN (
+                SELECT id FROM sessions
+                WHERE expires_at < NOW()
+                LIMIT %s
+            )
+            RETURNING 1
+        )
+        SELECT COUNT(*) AS count FROM expired
+    """, batch_size)[0]["count"]
+
+
+class PostgresSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, db, cleanup_interval=300, cleanup_batch_size=CLEANUP_BATCH_SIZE):
+        self.db = db
+        self.cleanup_interval = cleanup_interval
+        self.cleanup_batch_size = cleanup_batch_size
+        self._last_cleanup = time.monotonic()
+        self._cleanup_lock = threading.Lock()
+
+    def _new_session(self):
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def open_session(self, app, request):
+        # static files never need the session; a null session costs no query
+        if app.static_url_path and request.path.startswith(app.static_url_path + "/"):
+            return None
+
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid or len(sid) > 64:
+            return self._new_session()
+
+        # a replica may not have the row written by the previous response yet
+        with self.db.primary():
+            rows = self.db.execute("""
+                SELECT data, EXTRACT(EPOCH FROM expires_at - NOW()) AS ttl
+                FROM sessions
+                WHERE id = %s AND expires_at > NOW()
+            """, sid)
+        if not rows:
+            return self._new_session()
+        try:
+            data = self.serializer.loads(rows[0]["data"])
+        except ValueError:
+            return self._new_session()
+        return ServerSession(data, sid=sid, ttl=float(rows[0]["ttl"]))
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            # emptied (logout) - drop the row and the cookie; never store empty sessions
+            if session.modified and not session.new:
+                self.db.execute("DELETE FROM sessions WHERE id = %s", session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        needs_refresh = session.ttl is not None and session.ttl < lifetime / 2
+        if not (session.modified or needs_refresh):
+            return
+
+        self.db.execute("""
+            INSERT INTO sessions (id, data, expires_at)
+            VALUES (%s, %s, NOW() + %s * INTERVAL '1 second')
+            ON CONFLICT (id) DO UPDATE
+            SET data = EXCLUDED.data, expires_at = EXCLUDED.expires_at
+        """, session.sid, self.serializer.dumps(dict(session)), lifetime)
+
+        # non-permanent cookies have no expiry of their own, so they only need sending once
+        if session.new or session.permanent:
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+        self._maybe_cleanup()
+
+    def _maybe_cleanup(self):
+        if time.monotonic() - self._last_cleanup < self.cleanup_interval:
+            return
+        if not self._cleanup_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_cleanup = time.monotonic()
+            cleanup_expired(self.db, self.cleanup_batch_size)
+        finally:
+            self._cleanup_lock.release()
+
+
+def init_sessions(app, db, backend=None):
+    """Install the session backend named by `backend` or SESSION_BACKEND."""
+    backend = (backend or os.environ.get("SESSION_BACKEND", "postgres")).lower()
+    if backend not in SESSION_BACKENDS:
+        raise ValueError(f"SESSION_BACKEND must be one of {', '.join(SESSION_BACKENDS)}, not {backend!r}")
+
+    if backend == "postgres":
+        app.session_interface = PostgresSessionInterface(
+            db, cleanup_interval=int(os.environ.get("SESSION_CLEANUP_INTERVAL", 300)))
+    elif backend == "cookie":
+        app.session_interface = SecureCookieSessionInterface()
+    else:
+        from flask_session import Session
+
+        app.config["SESSION_TYPE"] = "filesystem"
+        Session(app)
+    return backend
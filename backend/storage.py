@@ -0,0 +1,226 @@
+"""
+Content-addressed storage for uploaded files.
+
+The app keeps addressing files by logical paths such as
+df_x/component_3/pictures/comp_3_1.jpg (that is what problem_photos stores
+and what /df/uploads/ links use). The bytes are stored once per distinct
+content under <root>/blobs/<aa>/<bb>/<sha256>; upload_files maps each logical
+path to its blob and blobs.refcount counts those mappings. A photo submitted
+again under another df_* folder therefore costs a hash, not a second copy.
+
+Files written before this existed are still served from their logical path
+on disk until `flask --app app dedupe-uploads` moves them into blobs.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+from werkzeug.security import safe_join
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class Storage:
+    def __init__(self, root):
+        self.root = root
+        self.blob_root = os.path.join(root, "blobs")
+
+    def blob_path(self, sha256):
+        return os.path.join(self.blob_root, sha256[:2], sha256[2:4], sha256)
+
+    def save(self, tx, logical_path, stream):
+        """Store one readable, seekable stream under `logical_path`; returns its sha256."""
+        return self.save_many(tx, [(logical_path, stream)])[0]
+
+    def save_many(self, tx, files):
+        """
+        Store [(logical_path, stream)] inside the transaction `tx` (from
+        db.transaction()) and return their sha256s. Two statements however
+        many files; a blob file is only written when no blob with the same
+        content exists yet.
+        """
+        if not files:
+            return []
+        hashed = [(logical_path, stream, *self._hash(stream)) for logical_path, stream in files]
+
+        blobs = {}
+        for _, _, sha256, size in hashed:
+            blobs[sha256] = (size, blobs.get(sha256, (size, 0))[1] + 1)
+        self._claim(tx, blobs)
+
+        written = set()
+        for _, stream, sha256, _ in hashed:
+            if sha256 not in written:
+                self._write_blob(sha256, stream)
+                written.add(sha256)
+
+        self._link(tx, [(logical_path, sha256) for logical_path, _, sha256, _ in hashed])
+        return [sha256 for _, _, sha256, _ in hashed]
+
+    def _hash(self, stream):
+        """(sha256, size) of a stream"""
+        digest = hashlib.sha256()
+        size = 0
+        stream.seek(0)
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            size += len(chunk)
+        return digest.hexdigest(), size
+
+    def _claim(self, tx, blobs):
+        """
+        Add references to {sha256: (size, count)}. The upsert locks the blob
+        rows until `tx` ends, and gc() deletes rows and files under the same
+        lock, so a blob checked on disk after this cannot be collected before
+        the references are committed. (Sorted, so concurrent uploads lock in
+        the same order.)
+        """
+        tx.execute_values("""
+            INSERT INTO blobs (sha256, size, refcount)
+            VALUES %s
+            ON CONFLICT (sha256) DO UPDATE SET refcount = blobs.refcount + EXCLUDED.refcount
+        """, [(sha256, size, count) for sha256, (size, count) in sorted(blobs.items())])
+
+    def _write_blob(self, sha256, stream):
+        """Write the blob file unless it exists. Returns True if it was written."""
+        path = self.blob_path(sha256)
+        if os.path.exists(path):
+            # an old file with no committed row yet would otherwise look abandoned to gc()
+            os.utime(path)
+            return False
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        stream.seek(0)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(stream, out, CHUNK_SIZE)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return True
+
+    def _link(self, tx, links):
+        """Point logical paths at blobs: [(logical_path, sha256)]"""
+        linked = {row["path"] for row in tx.execute_values("""
+            INSERT INTO upload_files (path, sha256)
+            VALUES %s
+            ON CONFLICT (path) DO NOTHING
+            RETURNING path
+        """, links, fetch=True)}
+        for logical_path, sha256 in links:
+            if logical_path not in linked:
+                # overwriting a logical path: release the blob it pointed to
+                self.delete(tx, logical_path)
+                tx.execute("INSERT INTO upload_files (path, sha256) VALUES (%s, %s)", logical_path, sha256)
+
+    def delete(self, db, logical_path):
+        """Forget a logical path. Its blob is removed by gc() once unreferenced."""
+        self.delete_many(db, [logical_path])
+
+    def delete_many(self, db, logical_paths):
+        """Forget several logical paths in one statement (paths not in blob storage are ignored)."""
+        if not logical_paths:
+            return
+        db.execute("""
+            WITH old AS (
+                DELETE FROM upload_files WHERE path = ANY(%s) RETURNING sha256
+            ), released AS (
+                SELECT sha256, COUNT(*) AS n FROM old GROUP BY sha256
+            )
+            UPDATE blobs SET refcount = blobs.refcount - released.n
+            FROM released
+            WHERE blobs.sha256 = released.sha256
+        """, list(logical_paths))
+
+    def resolve(self, db, logical_path):
+        """
+        Return (absolute file path, sha256) for a logical path. sha256 is None
+        for files not yet moved into blob storage; (None, None) if unknown.
+        """
+        return self.resolve_many(db, [logical_path])[logical_path]
+
+    def resolve_many(self, db, logical_paths):
+        """resolve() for several logical paths in one query: {logical path: (absolute path, sha256)}"""
+        blobs = {
+            row["path"]: row["sha256"]
+            for row in db.execute("SELECT path, sha256 FROM upload_files WHERE path = ANY(%s)", list(logical_paths))
+        }
+        resolved = {}
+        for logical_path in logical_paths:
+            if logical_path in blobs:
+                resolved[logical_path] = (self.blob_path(blobs[logical_path]), blobs[logical_path])
+                continue
+            legacy_path = safe_join(self.root, logical_path)
+            resolved[logical_path] = (legacy_path, None) if legacy_path and os.path.isfile(legacy_path) else (None, None)
+        return resolved
+
+    def gc(self, db, grace_seconds=3600):
+        """
+        Delete unreferenced blobs: rows whose refcount dropped to zero, and
+        files left behind by rolled-back uploads (no row, older than the
+        grace period). Returns the number of files removed.
+
+        Files are removed while their rows are locked (deleted, or claimed
+        with a placeholder row), so a concurrent save of the same content
+        waits and then writes the file again instead of linking to nothing.
+        """
+        removed = 0
+        with db.transaction() as tx:
+            for row in tx.execute("DELETE FROM blobs WHERE refcount <= 0 RETURNING sha256"):
+                path = self.blob_path(row["sha256"])
+                if os.path.exists(path):
+                    os.remove(path)
+                    removed += 1
+
+        known = {row["sha256"] for row in db.execute("SELECT sha256 FROM blobs")}
+        cutoff = time.time() - grace_seconds
+        for dirpath, _, filenames in os.walk(self.blob_root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if name in known or os.path.getmtime(path) >= cutoff:
+                    continue
+                with db.transaction() as tx:
+                    # waits for, and then skips, a save of this content that is still in progress
+                    claimed = tx.execute("""
+                        INSERT INTO blobs (sha256, size, refcount) VALUES (%s, 0, 0)
+                        ON CONFLICT (sha256) DO NOTHING
+                        RETURNING sha256
+                    """, name)
+                    if claimed:
+                        os.remove(path)
+                        tx.execute("DELETE FROM blobs WHERE sha256 = %s", name)
+                        removed += 1
+        return removed
+
+    def import_legacy(self, db):
+        """
+        Move files written before blob storage (everything under df_*/) into
+        blobs, one transaction per file. Returns (files moved, duplicate
+        bytes freed).
+        """
+        moved = freed = 0
+        for df_folder in sorted(os.listdir(self.root)):
+            df_dir = os.path.join(self.root, df_folder)
+            if not df_folder.startswith("df_") or not os.path.isdir(df_dir):
+                continue
+            for dirpath, _, filenames in os.walk(df_dir):
+                for name in sorted(filenames):
+                    abs_path = os.path.join(dirpath, name)
+                    logical_path = os.path.relpath(abs_path, self.root).replace(os.sep, "/")
+
+                    with open(abs_path, "rb") as f, db.transaction() as tx:
+                        sha256, size = self._hash(f)
+                        self._claim(tx, {sha256: (size, 1)})
+                        written = self._write_blob(sha256, f)
+                        self._link(tx, [(logical_path, sha256)])
+                    os.remove(abs_path)
+                    moved += 1
+                    if not written:
+                        freed += size
+        return moved, freed
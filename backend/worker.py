@@ -0,0 +1,16 @@
+"""
+Background job worker: python worker.py
+"""
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from db import Database
+from jobs import work
+
+
+if __name__ == "__main__":
+    db = Database(minconn=1, maxconn=2)
+    work(db, poll_interval=float(os.environ.get("JOB_POLL_INTERVAL", 2)))